@@ -1,44 +1,60 @@
 # Run this app with `python app.py` and
 # visit http://127.0.0.1:8050/ in your web browser.
 
-from dash import Dash, dcc, html, Input, Output
+import os
+import plotly.express as px
+from functools import partial
+from dash import Dash, dcc, html, ctx, no_update, Input, Output, State
+from dash import ClientsideFunction
 from datetime import date
+from flask import Response, jsonify, request
 
 from figures.correlation_figure import display_correlation_plot
 from figures.scatter_figure import display_correlation_scatter
-from figures.types_figure import types_of_calls
-from figures.type_inout_temp_figure import in_out_of_calls
+from figures.bars import bars_table
+from figures.types_figure import types_of_calls, types_of_calls_patch
+from figures.type_inout_temp_figure import in_out_of_calls, in_out_of_calls_patch
+from figures.types_animation import types_animation
 
+from helpers.aggregates import data_version
+from helpers.approximate import APPROXIMATE, computed, weather_dates
 from helpers.design import background_color, font_color, font_family, color_green
-from helpers.utils import load_weather_data
+from helpers.cache import cached_data, cached_figure, data_cache, figure_cache
+from helpers.downsample import visible_range
+from helpers.export import export
+from helpers.utils import format_date, format_label
+from helpers import metrics, registry
+from helpers.metrics import instrument
 
 
 class SliderDataManager:
-    def __init__(self):
-        yearsM = sorted(load_weather_data().resample("M").mean().index)
-        yearsW = sorted(load_weather_data().resample("W").mean().index)
-        yearsD = sorted(load_weather_data().resample("D").mean().index)
-        self.years = {"M": yearsM, "W": yearsW, "D": yearsD}
+    # Nothing is stored between two callbacks: the date of the slider only depends on
+    # the frequency and the value, so any worker can answer any user.
 
-        self.range = {}
-        self.current_freq = "M"
-        self.changed = False
+    def get_years(self, freq):
+        # The dates of the slider, read once per frequency and indexed by position.
+        return cached_data("slider_dates", weather_dates, freq)
+
+    def get_date(self, value, freq):
+        years = self.get_years(freq)
+
+        if value is None or not 0 <= value < len(years):
+            value = 0
+
+        return years[value]
 
     def get_value(self, value, freq):
-        if self.current_freq != freq:
-            return self.years.get(freq)[0]
+        return format_date(self.get_date(value, freq), freq)
 
-        return self.range.get(value, self.years.get(freq)[0])
+    def get_label(self, value, freq):
+        return format_label(self.get_date(value, freq), freq)
 
     def get_marks(self, freq):
-        years = self.years[freq]
-        self.range = {i: years[i].strftime("%Y-%m-%d") for i in range(len(years))}
-        self.current_freq = freq
-        self.changed = True
+        years = self.get_years(freq)
 
         marks = {
-            len(years) - 1: years[-1].strftime("%Y-%m-%d"),
-            0: years[0].strftime("%Y-%m-%d"),
+            len(years) - 1: format_label(years[-1], freq),
+            0: format_label(years[0], freq),
         }
 
         def create_marks(mark, start, end, prof=3):
@@ -46,7 +62,7 @@ class SliderDataManager:
                 return
 
             mid = (start + end) // 2
-            mark[mid] = years[mid].strftime("%Y-%m-%d")
+            mark[mid] = format_label(years[mid], freq)
             create_marks(mark, start, mid, prof - 1)
             create_marks(mark, mid, end, prof - 1)
 
@@ -58,16 +74,102 @@ class SliderDataManager:
 app = Dash(__name__)
 slider_data = SliderDataManager()
 
-frequency = {"Mois": "M", "Semaine": "W", "Jour": "D"}
+frequency = {
+    "Mois": "M",
+    "Semaine": "W",
+    "Jour": "D",
+    "Heure": "H",
+    "Heure de la semaine": "HW",
+}
 size_values = {"Précipitations": 0, "Vittesse du vent": 1}
 
+# "client": the animation of the 'Type et lieu' figures is played by the browser.
+# "server": each step of the animation is computed by the server.
+ANIMATION = os.environ.get("NYPD_ANIMATION", "client")
+
+
+def types_figures(freq, value=None, approximate=False):
+    # The 'Type et lieu' figures, for the date of the slider at 'value'.
+    value = slider_data.get_value(value, freq)
+
+    return (
+        cached_figure("types", types_of_calls, freq, value, approximate),
+        cached_figure("in_out", in_out_of_calls, freq, value, approximate),
+    )
+
+
+def exact_types(freq):
+    # Everything the exact 'Type et lieu' figures are drawn from.
+    if ANIMATION == "client":
+        cached_figure("frames", types_animation, freq, False)
+    else:
+        bars_table(freq, "desc")
+        bars_table(freq, "place")
+
+
+def exact_ready(freq):
+    """
+    In approximate mode (see 'helpers.approximate'), the 'Type et lieu' figures are
+    estimated from the sample until the exact ones are computed in the background.
+    """
+    return not APPROXIMATE or computed(
+        ("types", freq, data_version()), partial(exact_types, freq)
+    )
+
+
+def hot_figures(freq):
+    # The figures shown when a frequency is chosen, with the default inputs.
+    yield "correlation", partial(
+        cached_figure, "correlation", display_correlation_plot, freq, None, None
+    )
+    for size_value in sorted(set(size_values.values())):
+        yield f"scatter_{size_value}", partial(
+            cached_figure, "scatter", display_correlation_scatter, freq, size_value
+        )
+
+    # In approximate mode, the estimated figures are shown first.
+    for approximate in [True, False] if APPROXIMATE else [False]:
+        suffix = "_approximate" if approximate else ""
+        if ANIMATION == "client":
+            yield f"frames{suffix}", partial(
+                cached_figure, "frames", types_animation, freq, approximate
+            )
+        else:
+            yield f"types{suffix}", partial(types_figures, freq, 0, approximate)
+
+
+# plotly express fills its default template the first time it reads it, without a
+# lock: it is read here once, before several threads draw the figures at once.
+px.bar(x=[0], y=[0])
+px.scatter(x=[0], y=[0], size=[1])
+
+# The data and the figures are computed in the background, in the order of the
+# frequencies of the menu, the server answers as soon as it is imported.
+if os.environ.get("NYPD_WARM_UP", "1") != "0":
+    for priority, freq in enumerate(frequency.values()):
+        for name, task in hot_figures(freq):
+            registry.schedule(f"figure_{name}_{freq}", task, priority)
+    registry.warm_up()
+
 
 @app.callback(
     Output("figure-corr", "figure"),
     Input("frequence", "value"),
+    Input("figure-corr", "relayoutData"),
 )
-def figure_correlation(freq):
-    return display_correlation_plot(frequency.get(freq, "M"))
+@instrument("figure_correlation")
+def figure_correlation(freq, relayout):
+    # After a zoom, the visible dates are sent again at full resolution.
+    start, end = None, None
+    if ctx.triggered_id == "figure-corr":
+        dates = visible_range(relayout)
+        if dates is None:
+            return no_update
+        start, end = dates
+
+    return cached_figure(
+        "correlation", display_correlation_plot, frequency.get(freq, "M"), start, end
+    )
 
 
 @app.callback(
@@ -75,69 +177,171 @@ def figure_correlation(freq):
     Input("frequence", "value"),
     Input("size_scatter", "value"),
 )
+@instrument("scatter_figure")
 def scatter_figure(freq, size_value):
-    return display_correlation_scatter(
-        frequency.get(freq, "M"), size_values.get(size_value, 1)
+    return cached_figure(
+        "scatter",
+        display_correlation_scatter,
+        frequency.get(freq, "M"),
+        size_values.get(size_value, 1),
     )
 
 
-@app.callback(
-    Output("figure-types", "figure"),
-    Output("figure-types-in-out", "figure"),
-    Input("frequence", "value"),
-    Input("slider", "value"),
-)
-def figure_types(freq, value):
-    freq = frequency.get(freq, "M")
-    value = slider_data.get_value(value, freq)
-
-    return (types_of_calls(freq, value=value), in_out_of_calls(freq, value=value))
-
-
 @app.callback(
     Output("slider", "min"),
     Output("slider", "max"),
     Output("slider", "marks"),
     Input("frequence", "value"),
 )
+@instrument("slider_years")
 def slider_years(freq):
     return 0, *slider_data.get_marks(frequency.get(freq, "M"))
 
 
-@app.callback(
-    Output("slider", "value"),
-    Input("slider", "value"),
-    Input("stepper", "disabled"),
-    Input("stepper", "n_intervals"),
-)
-def update_slider(value, disable, _):
-    if disable:
-        return value
+if ANIMATION == "client":
+    # The server sends every frame of the animation when the frequency changes,
+    # the browser plays them (see 'assets/animation.js').
 
-    if slider_data.changed:
-        slider_data.changed = False
-        return 0
+    @app.callback(
+        Output("types-frames", "data"),
+        Output("exact-poll", "disabled"),
+        Input("frequence", "value"),
+        Input("exact-poll", "n_intervals"),
+    )
+    @instrument("figure_types_frames")
+    def figure_types_frames(freq, _):
+        freq = frequency.get(freq, "M")
+        polled = ctx.triggered_id == "exact-poll"
+
+        # The estimated frames are sent, and the server is polled until the exact
+        # ones are computed.
+        if not exact_ready(freq):
+            if polled:
+                return no_update, no_update
+            return cached_figure("frames", types_animation, freq, True), False
+
+        frames = cached_figure("frames", types_animation, freq, False)
+        # When they replace the estimated frames, the slider stays where it is.
+        return {**frames, "refined": polled}, True
+
+    app.clientside_callback(
+        ClientsideFunction("animation", "render"),
+        Output("figure-types", "figure"),
+        Output("figure-types-in-out", "figure"),
+        Output("date-slider", "children"),
+        Input("types-frames", "data"),
+        Input("slider", "value"),
+    )
 
-    j = len(slider_data.range)
-    return 0 if j == 0 else (value + 1) % j
+    app.clientside_callback(
+        ClientsideFunction("animation", "step"),
+        Output("slider", "value"),
+        Input("stepper", "n_intervals"),
+        Input("types-frames", "data"),
+        State("slider", "value"),
+        State("stepper", "disabled"),
+    )
 
+    app.clientside_callback(
+        ClientsideFunction("animation", "play_pause"),
+        Output("play_pause_button", "children"),
+        Output("stepper", "disabled"),
+        Input("play_pause_button", "n_clicks"),
+        Input("play_pause_button", "children"),
+    )
 
-@app.callback(Output("date-slider", "children"), Input("slider", "value"))
-def display_value(value):
-    return f"Date : {slider_data.range.get(value)}"
+else:
 
+    @app.callback(
+        Output("figure-types", "figure"),
+        Output("figure-types-in-out", "figure"),
+        Output("exact-poll", "disabled"),
+        Input("frequence", "value"),
+        Input("slider", "value"),
+        Input("exact-poll", "n_intervals"),
+        State("exact-poll", "disabled"),
+    )
+    @instrument("figure_types")
+    def figure_types(freq, value, _, exact_shown):
+        freq = frequency.get(freq, "M")
+        approximate = not exact_ready(freq)
+        triggered = set(ctx.triggered_prop_ids)
+
+        # The server is polled until the exact figures replace the estimated ones.
+        if triggered == {"exact-poll.n_intervals"} and approximate:
+            return no_update, no_update, no_update
+
+        # When only the slider moved, the figures are updated instead of being sent again.
+        if triggered == {"slider.value"} and exact_shown != approximate:
+            date = slider_data.get_value(value, freq)
+            return (
+                types_of_calls_patch(freq, date, approximate),
+                in_out_of_calls_patch(freq, date, approximate),
+                no_update,
+            )
+
+        return (*types_figures(freq, value, approximate), not approximate)
+
+    @app.callback(
+        Output("slider", "value"),
+        Input("frequence", "value"),
+        Input("stepper", "n_intervals"),
+        State("slider", "value"),
+        State("stepper", "disabled"),
+    )
+    @instrument("update_slider")
+    def update_slider(freq, _, value, disable):
+        if ctx.triggered_id == "frequence":
+            return 0
+
+        if disable:
+            return no_update
+
+        j = len(slider_data.get_years(frequency.get(freq, "M")))
+        return 0 if j == 0 else ((value or 0) + 1) % j
+
+    @app.callback(
+        Output("date-slider", "children"),
+        Input("frequence", "value"),
+        Input("slider", "value"),
+    )
+    @instrument("display_value")
+    def display_value(freq, value):
+        return f"Date : {slider_data.get_label(value, frequency.get(freq, 'M'))}"
+
+    @app.callback(
+        Output("play_pause_button", "children"),
+        Output("stepper", "disabled"),
+        Input("play_pause_button", "n_clicks"),
+        Input("play_pause_button", "children"),
+    )
+    @instrument("play_pause_button")
+    def play_pause_button(_, children):
+        if children == "Start":
+            return "Stop", False
+
+        return "Start", True
+
+
+@app.server.route("/health")
+def health():
+    status = registry.status()
+    return jsonify(status), 200 if status["ready"] else 503
+
+
+@app.server.route("/metrics")
+def metrics_page():
+    return Response(
+        metrics.render({"figure": figure_cache, "data": data_cache}),
+        mimetype="text/plain; version=0.0.4",
+    )
 
-@app.callback(
-    Output("play_pause_button", "children"),
-    Output("stepper", "disabled"),
-    Input("play_pause_button", "n_clicks"),
-    Input("play_pause_button", "children"),
-)
-def play_pause_button(_, children):
-    if children == "Start":
-        return "Stop", False
 
-    return "Start", True
+@app.server.route("/export/<name>")
+@instrument("export")
+def export_page(name):
+    # The numbers behind the figures, see 'helpers.export'.
+    return export(name, request)
 
 
 paraf_intro = """
@@ -150,10 +354,12 @@ __Remarque:__
 Grace au bouton ci dessous ___qui est toujours visible sur la page___, vous pourrez changer la
 fréquence de tout les graphs de la page.  
 
-Trois options s'offrent à vous:
+Cinq options s'offrent à vous:
  - par Mois
  - par Semaine
  - par Jour
+ - par Heure
+ - par Heure de la semaine, le nombre d'appels de chaque heure de chaque jour de la semaine
 """
 
 paraf_corr = """
@@ -204,7 +410,7 @@ app.layout = html.Div(
             children=[
                 dcc.Dropdown(
                     id="frequence",
-                    options=["Jour", "Semaine", "Mois"],
+                    options=["Heure", "Jour", "Semaine", "Mois", "Heure de la semaine"],
                     value="Mois",
                     searchable=False,
                     clearable=False,
@@ -262,6 +468,9 @@ app.layout = html.Div(
                                 ),
                             ],
                         ),
+                        dcc.Store(id="types-frames"),
+                        # Polls the exact figures while the estimated ones are shown.
+                        dcc.Interval(id="exact-poll", interval=1000, disabled=True),
                         dcc.Interval(
                             id="stepper",
                             interval=500,  # in milliseconds
@@ -0,0 +1,66 @@
+// Animation of the 'Type et lieu' figures, played in the browser from the frames
+// sent by the server when the frequency changes.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    animation: {
+        render: function (frames, value) {
+            if (!frames) {
+                return [
+                    window.dash_clientside.no_update,
+                    window.dash_clientside.no_update,
+                    window.dash_clientside.no_update,
+                ];
+            }
+
+            const i = Math.min(value || 0, frames.dates.length - 1);
+            const date = frames.dates[i];
+
+            // New objects, otherwise the graphs are not redrawn.
+            const types = JSON.parse(JSON.stringify(frames.types));
+            types.data[0].y = frames.desc[i];
+            // Estimated from the sample: the errors of the estimates.
+            if (frames.desc_error) {
+                types.data[0].error_y.array = frames.desc_error[i];
+                types.data[0].customdata = frames.desc_error[i];
+            }
+            types.layout.shapes[0].x0 = date;
+            types.layout.shapes[0].x1 = date;
+
+            const inOut = JSON.parse(JSON.stringify(frames.in_out));
+            inOut.data.forEach(function (trace, j) {
+                trace.y = [frames.place[i][j]];
+                if (frames.place_error) {
+                    trace.error_y.array = [frames.place_error[i][j]];
+                    trace.customdata = [frames.place_error[i][j]];
+                }
+            });
+
+            return [types, inOut, "Date : " + frames.labels[i]];
+        },
+
+        step: function (n_intervals, frames, value, disabled) {
+            const triggered = window.dash_clientside.callback_context.triggered.map(
+                function (trigger) {
+                    return trigger.prop_id;
+                }
+            );
+
+            // The exact frames replace the estimated ones without moving the slider.
+            if (triggered.includes("types-frames.data")) {
+                return frames && frames.refined ? window.dash_clientside.no_update : 0;
+            }
+            if (disabled || !frames) {
+                return window.dash_clientside.no_update;
+            }
+
+            return ((value || 0) + 1) % frames.dates.length;
+        },
+
+        play_pause: function (n_clicks, children) {
+            if (children === "Start") {
+                return ["Stop", false];
+            }
+
+            return ["Start", true];
+        },
+    },
+});
@@ -0,0 +1,49 @@
+"""
+Check the backends of 'helpers.queries' against the pandas reference, on the data of
+the folder 'data' (see 'data/get_data.py'). Every query of every frequency is made
+with each backend, and the differences with the reference are printed with the time
+taken by the backend. The exit status is 1 when a backend differs.
+
+Usage, from the folder 'src':
+	python -m benchmarks.check_backends cube duckdb --start 2019-01-01 --end 2019-06-30
+"""
+
+
+import argparse
+import sys
+import time
+
+from helpers.queries import BACKENDS, check_backend
+
+
+def check(backends, reference="pandas", start=None, end=None):
+    # The reference is computed first, its results are then read from the cache.
+    failed = False
+
+    for backend in [reference, *backends]:
+        began = time.perf_counter()
+        errors = check_backend(backend, reference, start=start, end=end)
+        print(f"{backend}: {time.perf_counter() - began:.2f} s")
+
+        for query, error in errors.items():
+            print(f"\t{query}: {error}")
+        failed = failed or bool(errors)
+
+    return not failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the backends of the queries.")
+    parser.add_argument(
+        "backends",
+        nargs="*",
+        choices=list(BACKENDS),
+        default=["cube"],
+        help="backends compared with the reference",
+    )
+    parser.add_argument("--reference", choices=list(BACKENDS), default="pandas")
+    parser.add_argument("--start", default=None, help="first date of the queries")
+    parser.add_argument("--end", default=None, help="last date of the queries")
+    args = parser.parse_args()
+
+    sys.exit(0 if check(args.backends, args.reference, args.start, args.end) else 1)
@@ -0,0 +1,77 @@
+"""
+Check that the hot figures can be built at the same time by several threads, as they
+are by the warm-up, the thread of the exact figures and the callbacks when the
+dashboard starts. Each round starts a new dashboard, with nothing loaded, then runs
+every hot figure task of every frequency at once, each task on several threads. The
+errors are printed and the exit status is 1 when a round failed.
+
+Usage, from the folder 'src' (NYPD_APPROXIMATE=1 also checks the estimated figures):
+	python -m benchmarks.check_warm_up --rounds 20 --copies 2
+"""
+
+
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+
+def hot_tasks(dashboard):
+    for freq in dashboard.frequency.values():
+        for name, task in dashboard.hot_figures(freq):
+            yield f"{name}_{freq}", task
+        if dashboard.APPROXIMATE:
+            yield f"exact_{freq}", partial(dashboard.exact_ready, freq)
+
+
+def run_round(copies):
+    # A new process: the registry and the caches are empty.
+    os.environ["NYPD_WARM_UP"] = "0"
+    import NYPD_dash_visualisation as dashboard
+
+    tasks = [task for task in hot_tasks(dashboard) for _ in range(copies)]
+    barrier = threading.Barrier(len(tasks))
+
+    def run(name, task):
+        barrier.wait()
+        try:
+            task()
+        except Exception:
+            return name, traceback.format_exc()
+
+    with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+        results = executor.map(lambda item: run(*item), tasks)
+        return dict(result for result in results if result is not None)
+
+
+def check(rounds=20, copies=2):
+    failed = False
+    context = multiprocessing.get_context("spawn")
+
+    for i in range(rounds):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            errors = executor.submit(run_round, copies).result()
+
+        print(f"round {i}: {len(errors)} failed")
+        for name, error in errors.items():
+            print(f"\t{name}: {error}")
+        failed = failed or bool(errors)
+
+    return not failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the hot figures concurrently, from a cold start."
+    )
+    parser.add_argument("--rounds", type=int, default=20, help="number of cold starts")
+    parser.add_argument(
+        "--copies", type=int, default=2, help="threads running each task at once"
+    )
+    args = parser.parse_args()
+
+    sys.exit(0 if check(args.rounds, args.copies) else 1)
@@ -0,0 +1,163 @@
+"""
+Synthetic NYPD calls files, to see how the project behaves with far more calls than
+the sample 'data/NYPD_calls_15.csv.zip'.
+
+The files have the columns read by 'data/get_data.py' ('INCIDENT_DATE',
+'INCIDENT_TIME', 'TYP_DESC', 'CIP_JOBS') in the format of the real ones, and are
+zipped like them ('NYPD_calls_{n}.csv.zip'). The calls follow the shape of the real
+data:
+	- more calls in summer than in winter, and during the weekends.
+	- fewer calls during the lockdown of spring 2020.
+	- few calls at night, most of them in the afternoon and the evening.
+	- a few frequent call types ('TYP_DESC') and many rare ones.
+	- most calls are 'Non CIP', and dropped by 'data/get_data.py'.
+
+Usage, from the folder 'src':
+	python -m benchmarks.generate_calls --rows 10000000 --files 8 --output data
+"""
+
+
+import argparse
+import io
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+
+START = "2018-01-01"
+END = "2020-12-31"
+
+# Relative number of calls of each type.
+TYP_DESCS = {
+    "DISPUTE: DOMESTIC/RESIDENCE": 10,
+    "ALARMS: COMMERCIAL/BURGLARY": 9,
+    "DISORDERLY: GROUP/OUTSIDE": 8,
+    "EMS: OTHER": 7,
+    "ASSAULT (IN PROGRESS): OTHER/INSIDE": 6,
+    "DISPUTE: OTHER/OUTSIDE": 6,
+    "NOISE: RESIDENCE": 6,
+    "ASSAULT (IN PROGRESS): OTHER/OUTSIDE": 5,
+    "DISORDERLY: PERSON/INSIDE": 5,
+    "LARCENY (IN PROGRESS): OTHER/INSIDE": 5,
+    "SUSPICIOUS PERSON/VEHICLE: OUTSIDE": 5,
+    "HARASSMENT: DOMESTIC/RESIDENCE": 4,
+    "INVESTIGATE/POSSIBLE CRIME: CALLS FOR HELP/INSIDE": 4,
+    "LARCENY (IN PROGRESS): OTHER/OUTSIDE": 4,
+    "PAST DISPUTE: DOMESTIC/RESIDENCE": 4,
+    "VEHICLE ACCIDENT: INJURY": 4,
+    "LARCENY (IN PROGRESS): COMMERCIAL": 3,
+    "VEHICLE ACCIDENT: PEDESTRIAN STRUCK": 3,
+    "BURGLARY (IN PROGRESS): RESIDENCE/INSIDE": 2,
+    "ROBBERY (IN PROGRESS): OTHER/OUTSIDE": 2,
+    "ASSAULT (IN PROGRESS): PERSON/TRANSIT": 1,
+    "BURGLARY (IN PROGRESS): COMMERCIAL": 1,
+    "ROBBERY (IN PROGRESS): COMMERCIAL": 1,
+    "SHOTS FIRED: OUTSIDE": 1,
+}
+
+CIP_JOBS = {"Non CIP": 55, "Non Critical": 25, "Serious": 15, "Critical": 5}
+
+# Relative number of calls of each hour of the day, from 0h to 23h.
+HOURS = [
+    3.2, 2.6, 2.1, 1.7, 1.4, 1.4, 1.9, 2.8, 3.6, 4.1, 4.4, 4.6,
+    4.8, 5.0, 5.3, 5.6, 5.8, 5.9, 5.8, 5.6, 5.2, 4.8, 4.3, 3.7,
+]  # fmt: skip
+
+# From Monday to Sunday.
+WEEKDAYS = [0.97, 0.98, 0.99, 1.0, 1.03, 1.05, 1.0]
+
+LOCKDOWN = ("2020-03-15", "2020-06-01")
+
+
+def probabilities(weights):
+    weights = np.asarray(weights, dtype=float)
+    return weights / weights.sum()
+
+
+def day_weights(days):
+    # Highest around the 20th of July, like the temperature.
+    season = 1 + 0.15 * np.cos(2 * np.pi * (days.dayofyear - 201) / 365.25)
+    weekday = np.array(WEEKDAYS)[days.dayofweek]
+    lockdown = np.where((days >= LOCKDOWN[0]) & (days < LOCKDOWN[1]), 0.75, 1)
+
+    return season * weekday * lockdown
+
+
+def random_calls(rng, rows, days):
+    """
+    'rows' random calls as a DataFrame with the columns of a NYPD calls file.
+    """
+    day_strings = np.array(days.strftime("%m/%d/%Y"), dtype=object)
+    seconds = np.arange(24 * 3600)
+    time_strings = np.array(
+        [f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in seconds],
+        dtype=object,
+    )
+    typ_descs = np.array(list(TYP_DESCS), dtype=object)
+    cip_jobs = np.array(list(CIP_JOBS), dtype=object)
+
+    day = rng.choice(len(days), rows, p=probabilities(day_weights(days)))
+    hour = rng.choice(24, rows, p=probabilities(HOURS))
+    second = hour * 3600 + rng.integers(0, 3600, rows)
+
+    return pd.DataFrame(
+        {
+            "INCIDENT_DATE": day_strings[day],
+            "INCIDENT_TIME": time_strings[second],
+            "TYP_DESC": typ_descs[
+                rng.choice(
+                    len(typ_descs), rows, p=probabilities(list(TYP_DESCS.values()))
+                )
+            ],
+            "CIP_JOBS": cip_jobs[
+                rng.choice(
+                    len(cip_jobs), rows, p=probabilities(list(CIP_JOBS.values()))
+                )
+            ],
+        }
+    )
+
+
+def generate_calls(
+    save_path, rows, files=1, start=START, end=END, seed=0, chunk_rows=1_000_000
+):
+    """
+    Write 'rows' calls in 'files' files 'NYPD_calls_{n}.csv.zip' of 'save_path'.
+    The calls are generated and written 'chunk_rows' at a time, so any number of
+    rows fits in memory. Returns the paths of the files.
+    """
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(start, end)
+    os.makedirs(save_path, exist_ok=True)
+
+    paths = []
+    for n in range(files):
+        file_rows = rows // files + (n < rows % files)
+        path = os.path.join(save_path, f"NYPD_calls_{n}.csv.zip")
+
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            with archive.open(f"NYPD_calls_{n}.csv", "w", force_zip64=True) as raw:
+                with io.TextIOWrapper(raw, encoding="utf-8", newline="") as f:
+                    for first in range(0, max(file_rows, 1), chunk_rows):
+                        size = min(chunk_rows, file_rows - first)
+                        random_calls(rng, size, days).to_csv(
+                            f, header=first == 0, index=False
+                        )
+
+        paths.append(path)
+
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic NYPD calls files.")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="number of calls")
+    parser.add_argument("--files", type=int, default=1, help="number of files")
+    parser.add_argument("--output", default=".", help="folder of the files")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for path in generate_calls(args.output, args.rows, args.files, seed=args.seed):
+        print(path)
@@ -0,0 +1,316 @@
+"""
+Benchmark of the whole project on synthetic calls (see 'benchmarks.generate_calls').
+
+The stages are measured one after the other, each in a new process so that its
+peak memory is its own:
+	- ingest: 'data/get_data.py' reading the NYPD calls files, in rows per second.
+	- aggregation: reading the calls dataset then building the aggregates of each
+	frequency.
+	- callbacks: the callbacks of the figures called through the Dash server, for
+	each frequency, the first time (cold: the aggregates are read and the figure is
+	built) and then again (warm: median of the next calls, from the caches).
+The peak memory includes the Python interpreter and the imported modules.
+
+The results are written as JSON with the parameters, the versions of the libraries
+and the git commit, so that two runs can be compared.
+
+Usage, from the folder 'src':
+	python -m benchmarks.run --rows 10000000 --files 8 --workers 4 --output results.json
+"""
+
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generate_calls import generate_calls
+
+
+SRC_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The callbacks of the figures: output, inputs other than the frequency, and states.
+CALLBACKS = {
+    "figure_correlation": (
+        "figure-corr.figure",
+        [("figure-corr", "relayoutData", None)],
+        [],
+    ),
+    "scatter_figure": (
+        "figure-scatter.figure",
+        [("size_scatter", "value", "Précipitations")],
+        [],
+    ),
+    "slider_years": ("..slider.min...slider.max...slider.marks..", [], []),
+    "figure_types_frames": (
+        "..types-frames.data...exact-poll.disabled..",
+        [("exact-poll", "n_intervals", 0)],
+        [],
+    ),
+    "figure_types": (
+        "..figure-types.figure...figure-types-in-out.figure...exact-poll.disabled..",
+        [("slider", "value", 0), ("exact-poll", "n_intervals", 0)],
+        [("exact-poll", "disabled", True)],
+    ),
+}
+
+
+def peak_memory():
+    # In bytes, for this process and the processes it started.
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def measured(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+
+    return {
+        "seconds": time.perf_counter() - start,
+        "peak_memory_bytes": peak_memory(),
+        **(result or {}),
+    }
+
+
+def in_new_process(function, *args):
+    context = multiprocessing.get_context("spawn")
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(measured, function, *args).result()
+
+
+def folder_size(path):
+    return sum(
+        os.path.getsize(os.path.join(folder, name))
+        for folder, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def ingest(data_path, workers, memory_limit):
+    from data.get_data import generate_data_NYPD_calls, generate_data_weather
+
+    generate_data_NYPD_calls(
+        os.path.join(data_path, "NYPD_calls_*.csv.zip"),
+        os.path.join(data_path, "NYPD_calls"),
+        workers=workers,
+        memory_limit=memory_limit,
+    )
+    generate_data_weather(
+        os.path.join(SRC_PATH, "data", "weather.csv.zip"),
+        os.path.join(data_path, "weather.parquet"),
+    )
+
+
+def aggregate(data_path):
+    from data.get_data import calls_counts, read_dictionary
+    from helpers.aggregates import FREQUENCIES, build_aggregates
+
+    # The calls are read and counted file by file, the first time after the ingest.
+    calls_path = os.path.join(data_path, "NYPD_calls")
+    start = time.perf_counter()
+    counts = calls_counts(calls_path)
+    weather = pd.read_parquet(os.path.join(data_path, "weather.parquet"))
+    read_seconds = time.perf_counter() - start
+
+    frequencies = {}
+    for freq in FREQUENCIES:
+        start = time.perf_counter()
+        build_aggregates(
+            counts,
+            read_dictionary(calls_path),
+            weather,
+            os.path.join(data_path, "aggregates"),
+            [freq],
+        )
+        frequencies[freq] = time.perf_counter() - start
+
+    return {
+        "rows": int(counts["M"][1].sum()),
+        "read_seconds": read_seconds,
+        "frequencies_seconds": frequencies,
+    }
+
+
+def update_component(client, output, inputs, states=()):
+    """
+    Call a callback like the browser does, 'inputs' and 'states' are lists of
+    (id, property, value).
+    """
+    outputs = [
+        dict(zip(("id", "property"), part.rsplit(".", 1)))
+        for part in output.strip(".").split("...")
+    ]
+    response = client.post(
+        "/_dash-update-component",
+        json={
+            "output": output,
+            "outputs": outputs if output.startswith("..") else outputs[0],
+            "inputs": [
+                {"id": id, "property": prop, "value": value}
+                for id, prop, value in inputs
+            ],
+            "state": [
+                {"id": id, "property": prop, "value": value}
+                for id, prop, value in states
+            ],
+            "changedPropIds": [f"{inputs[0][0]}.{inputs[0][1]}"],
+        },
+    )
+    # 204: the callback did not update anything.
+    if response.status_code not in (200, 204):
+        raise RuntimeError(f"{output}: {response.status_code} {response.data[:200]}")
+
+
+def callbacks(work_path, repeat):
+    # The dashboard reads 'data/aggregates' from the current folder.
+    os.chdir(work_path)
+    os.environ["NYPD_WARM_UP"] = "0"
+    sys.path.insert(0, SRC_PATH)
+
+    import NYPD_dash_visualisation as dashboard
+
+    client = dashboard.app.server.test_client()
+    outputs = {
+        dependency["output"] for dependency in client.get("/_dash-dependencies").json
+    }
+
+    results = {}
+    for name, (output, inputs, states) in CALLBACKS.items():
+        # Only the callbacks of the animation mode of the dashboard exist.
+        if output not in outputs:
+            continue
+
+        results[name] = {}
+        for label in dashboard.frequency:
+            arguments = [("frequence", "value", label), *inputs]
+
+            timings = []
+            for _ in range(repeat + 1):
+                start = time.perf_counter()
+                update_component(client, output, arguments, states)
+                timings.append(time.perf_counter() - start)
+
+            results[name][label] = {
+                "cold_seconds": timings[0],
+                "warm_seconds": statistics.median(timings[1:]),
+            }
+
+    return {"callbacks": results}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=SRC_PATH,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(work_path, rows, files, workers=1, memory_limit=None, repeat=5):
+    """
+    The data is generated in the folder 'work_path', the results are returned as a
+    dict.
+    """
+    data_path = os.path.join(work_path, "data")
+
+    start = time.perf_counter()
+    generate_calls(data_path, rows, files)
+    generate_seconds = time.perf_counter() - start
+
+    results = {
+        "parameters": {
+            "rows": rows,
+            "files": files,
+            "workers": workers,
+            "memory_limit_bytes": memory_limit,
+            "repeat": repeat,
+        },
+        "environment": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "cpus": os.cpu_count(),
+            "platform": platform.platform(),
+        },
+        "generate_seconds": generate_seconds,
+    }
+
+    results["ingest"] = in_new_process(ingest, data_path, workers, memory_limit)
+    results["ingest"]["rows_per_second"] = rows / results["ingest"]["seconds"]
+    results["ingest"]["dataset_bytes"] = folder_size(
+        os.path.join(data_path, "NYPD_calls")
+    )
+
+    results["aggregation"] = in_new_process(aggregate, data_path)
+    results["callbacks"] = in_new_process(callbacks, work_path, repeat)["callbacks"]
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the project.")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="number of calls")
+    parser.add_argument("--files", type=int, default=1, help="number of calls files")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="processes used by the ingest"
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=int,
+        default=None,
+        help="memory in MB used by the ingest (see 'data/get_data.py')",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="warm calls of each callback"
+    )
+    parser.add_argument(
+        "--workdir",
+        default=None,
+        help="folder of the generated data, a temporary folder removed at the end "
+        "when not given",
+    )
+    parser.add_argument("--output", default=None, help="JSON file of the results")
+    args = parser.parse_args()
+
+    work_path = args.workdir or tempfile.mkdtemp(prefix="nypd-benchmark-")
+    try:
+        results = run(
+            work_path,
+            args.rows,
+            args.files,
+            args.workers,
+            args.memory_limit and args.memory_limit * 1024**2,
+            args.repeat,
+        )
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(work_path, ignore_errors=True)
+
+    output = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
@@ -9,73 +9,708 @@ In this folder 'data', you can find:
 	- weather.csv.zip: This file contains the data about the weather.
 	https://meteostat.net/fr/place/us/new-york-city?t=2018-01-01/2020-12-31
 
-	- NYPD_calls.pkl: This file contains all the data about the NYPD calls needed for this project.
+	- NYPD_calls: This folder is a parquet dataset, partitioned by month ('month=YYYY-MM'),
+	which contains all the data about the NYPD calls needed for this project.
+	The day of a call is stored as the number of days since 1970-01-01 ('day') and the
+	texts as categories, whose codes are the same in every file of the dataset.
+	The file 'NYPD_calls/_manifest.json' lists the NYPD_calls_{n}.csv.zip already ingested
+	and 'NYPD_calls/_dictionary.json' the categories of each text column.
+	The folder 'NYPD_calls/_counts' contains the number of calls of each file per bucket,
+	description and place, added up to build the aggregates.
+	With '--sample-size', the folder 'NYPD_calls/_sample' contains at most this number
+	of calls of each day drawn at random and the number of calls of each day, read by
+	the approximate mode of the dashboard (see 'helpers/approximate.py'). Each file is
+	sampled on its own ('_sample/files'), then the samples are merged.
 
-	- weather.pkl: This file contains all the data about the weather in New-York needed for this project.
+	- weather.parquet: This file contains all the data about the weather in New-York needed for this project.
 
-This script will create two files 'NYPD_calls.pkl' and 'weather.pkl'.
+	- aggregates: This folder contains the number of calls and the weather means per month,
+	week, day, hour and hour of the week. These are the only data read by the dashboard.
+
+This script will create the folders 'NYPD_calls', 'aggregates' and the file 'weather.parquet'.
 """
 
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import argparse
 import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Iterator
+
+# The aggregates are computed with the code of the dashboard, which is in the parent folder.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from helpers.aggregates import FREQUENCIES, build_aggregates
+from helpers.buckets import add_counts, bucket_column, bucket_ids, sparse_counts
+
+
+# The first place whose keywords appear in the last part of 'TYP_DESC' wins.
+PLACE_KEYWORDS = {
+    "Intérieur": ["RESIDENCE", "INSIDE", "DOMESTIC", "COMMERCIAL"],
+    "Extérieur": ["OUTSIDE", "TRANSIT"],
+}
+UNKNOWN_PLACE = "Inconnu"
+
+# Number of rows read to estimate the memory used by a row of a NYPD calls file.
+SAMPLE_ROWS = 10_000
+
+# Ignored when reading the dataset, like every file starting with '_'.
+MANIFEST = "_manifest.json"
+DICTIONARY = "_dictionary.json"
+SAMPLE = "_sample"
+COUNTS = "_counts"
+
+# Calls counted at once when the aggregates are built, read from several files.
+COUNT_ROWS = 1_000_000
+
+# The counts of no call: no bucket, description or place (see 'count_calls').
+NO_COUNTS = [np.zeros(0, np.int64)] * 3, np.zeros(0, np.int64)
+
+# Calls of each day kept in the sample, 0 for no sample (the approximate mode needs one).
+SAMPLE_SIZE = 0
 
+# The columns of the sampled calls, with their hash. The day is the bucket of 'D'.
+SAMPLE_COLUMNS = list(
+    dict.fromkeys(["day", "hour", "desc", "place", *map(bucket_column, FREQUENCIES)])
+)
 
-def inside_outside(line: str) -> str:
+# The text columns of the calls dataset, stored as categories.
+CATEGORICAL_COLUMNS = ["desc", "place", "cipJobs"]
+
+# Changed with the columns of the calls dataset, so that the files ingested before are
+# read again by an incremental run.
+CALLS_FORMAT = 3
+
+
+def inside_outside(line: str, keywords: dict = PLACE_KEYWORDS) -> str:
     line = line.split("/")[-1]
-    inside = ["RESIDENCE", "INSIDE", "DOMESTIC", "COMMERCIAL"]
-    outside = ["OUTSIDE", "TRANSIT"]
-
-    if any(ext in line for ext in inside):
-        return "Intérieur"
-    elif any(ext in line for ext in outside):
-        return "Extérieur"
-    return "Inconnu"
-
-
-def generate_data_NYPD_calls(file_format: str, save_path: str) -> None:
-    all_files = glob.glob(file_format)
-
-    dataset = pd.concat(
-        [
-            pd.read_csv(
-                file,
-                parse_dates=["INCIDENT_DATE"],
-                index_col=["INCIDENT_DATE"],
-                usecols=["INCIDENT_DATE", "TYP_DESC", "CIP_JOBS"],
-                compression="zip",
-            )
-            for file in all_files
-        ]
-    )
 
-    dataset.index.name = "date"
+    for place, words in keywords.items():
+        if any(word in line for word in words):
+            return place
+    return UNKNOWN_PLACE
+
+
+def call_description(line: str) -> str:
+    return line.split(":")[0].split(" (IN PROGRESS)")[0].capitalize()
+
+
+def broadcast_categories(codes: np.ndarray, values: list) -> pd.Categorical:
+    value_codes, categories = pd.factorize(np.array(values, dtype=object), sort=True)
+    codes = np.where(codes < 0, -1, value_codes[codes])
+
+    return pd.Categorical.from_codes(codes, categories)
+
+
+def classify_calls(typ_desc: pd.Series, keywords: dict = PLACE_KEYWORDS) -> dict:
+    # Each distinct 'TYP_DESC' is classified once, then the result is broadcast to every row.
+    codes, uniques = pd.factorize(typ_desc)
+
+    desc = [call_description(line) for line in uniques]
+    place = [inside_outside(line, keywords).capitalize() for line in uniques]
+
+    return {
+        "desc": broadcast_categories(codes, desc),
+        "place": broadcast_categories(codes, place),
+    }
+
+
+def incident_hours(incident_time: pd.Series) -> np.ndarray:
+    # Each distinct 'INCIDENT_TIME' ('HH:MM:SS') is parsed once. A missing time is
+    # counted at 0h: its code is -1, which picks the last hour of the list.
+    codes, uniques = pd.factorize(incident_time)
+    hours = [int(time.split(":")[0]) for time in uniques]
+
+    return np.array(hours + [0], dtype=np.int8)[codes]
+
+
+def prepare_calls(
+    dataset: pd.DataFrame, keywords: dict = PLACE_KEYWORDS
+) -> pd.DataFrame:
     dataset = dataset.rename(columns={"TYP_DESC": "typDesc", "CIP_JOBS": "cipJobs"})
     dataset = dataset[dataset.cipJobs != "Non CIP"]
 
-    dataset["desc"] = dataset.typDesc.apply(
-        lambda x: x.split(":")[0].split(" (IN PROGRESS)")[0].capitalize()
+    dataset = dataset.assign(
+        **classify_calls(dataset.typDesc, keywords),
+        hour=incident_hours(dataset.INCIDENT_TIME),
+    )
+
+    # The buckets of each call, used to count the calls per month, week and hour. The
+    # day of a call is its bucket of the days.
+    times = dataset.index.values.astype("datetime64[h]") + dataset.hour.values.astype(
+        "timedelta64[h]"
+    )
+    for freq in FREQUENCIES:
+        if bucket_column(freq) != "day":
+            dataset[bucket_column(freq)] = bucket_ids(times, freq)
+
+    dataset = dataset.assign(
+        day=bucket_ids(dataset.index.values, "D"),
+        cipJobs=dataset.cipJobs.cat.remove_unused_categories(),
     )
-    dataset["place"] = dataset.typDesc.apply(lambda x: inside_outside(x).capitalize())
-    dataset = dataset.drop(columns=["typDesc"])
 
-    dataset.to_pickle(save_path)
+    return dataset.drop(columns=["typDesc", "INCIDENT_TIME"]).reset_index(drop=True)
+
+
+def read_calls_chunks(
+    file: str, keywords: dict = PLACE_KEYWORDS, memory_limit: int = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Read a NYPD calls file chunk by chunk. The number of rows of a chunk is chosen
+    from the memory used by the previous one so that it stays under 'memory_limit'
+    bytes. Without 'memory_limit', the whole file is read at once.
+    """
+    chunk_size = SAMPLE_ROWS if memory_limit else None
+
+    with pd.read_csv(
+        file,
+        parse_dates=["INCIDENT_DATE"],
+        index_col=["INCIDENT_DATE"],
+        usecols=["INCIDENT_DATE", "INCIDENT_TIME", "TYP_DESC", "CIP_JOBS"],
+        # The texts repeated on every row are read as categories, not as strings.
+        dtype={"TYP_DESC": "category", "CIP_JOBS": "category"},
+        compression="zip",
+        iterator=True,
+    ) as reader:
+        while True:
+            try:
+                chunk = reader.get_chunk(chunk_size)
+            except StopIteration:
+                return
+
+            if memory_limit:
+                # The raw chunk and the prepared one are in memory at the same time.
+                row_size = 2 * chunk.memory_usage(deep=True).sum() / max(len(chunk), 1)
+                chunk_size = max(1, int(memory_limit // row_size))
+
+            yield prepare_calls(chunk, keywords)
+
+
+def read_dictionary(save_path: str) -> dict:
+    try:
+        with open(os.path.join(save_path, DICTIONARY)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {column: [] for column in CATEGORICAL_COLUMNS}
+
+
+def write_dictionary(save_path: str, dictionary: dict) -> None:
+    os.makedirs(save_path, exist_ok=True)
+
+    # Replaced at once, the other workers never read half a file.
+    path = os.path.join(save_path, DICTIONARY)
+    with open(f"{path}.{os.getpid()}", "w") as f:
+        json.dump(dictionary, f, indent=4, ensure_ascii=False)
+    os.replace(f"{path}.{os.getpid()}", path)
+
+
+def shared_categories(dataset: pd.DataFrame, save_path: str, lock) -> pd.DataFrame:
+    """
+    Give the categorical columns the categories of the dictionary shared by every file
+    of the dataset, so that a code is the same value in all of them. The values not in
+    the dictionary yet are added at its end: the codes already written never change.
+    """
+    dictionary = read_dictionary(save_path)
+
+    def missing(dictionary):
+        return {
+            column: list(
+                dataset[column].cat.categories.difference(
+                    dictionary[column], sort=False
+                )
+            )
+            for column in CATEGORICAL_COLUMNS
+        }
+
+    if any(missing(dictionary).values()):
+        with lock:
+            # Another worker may have added some of the values in the meantime.
+            dictionary = read_dictionary(save_path)
+            for column, values in missing(dictionary).items():
+                dictionary[column] += values
+            write_dictionary(save_path, dictionary)
+
+    return dataset.assign(
+        **{
+            column: dataset[column].cat.set_categories(dictionary[column])
+            for column in CATEGORICAL_COLUMNS
+        }
+    )
+
+
+def append_calls(dataset: pd.DataFrame, save_path: str, name: str) -> None:
+    # One folder per month so that readers can skip whole months with a date filter.
+    months, codes = np.unique(dataset.bucket_M.values, return_inverse=True)
+    dataset["month"] = pd.Categorical.from_codes(
+        codes, np.datetime_as_string(months.astype("datetime64[M]"))
+    )
+    dataset.to_parquet(
+        save_path,
+        partition_cols=["month"],
+        index=False,
+        basename_template=name + "-{i}.parquet",
+    )
+
+
+def row_hashes(name: str, first: int, size: int) -> np.ndarray:
+    """
+    A random number for each row of the file 'name', from the row 'first' on: always
+    the same for the same row, whatever the chunks (splitmix64 of the file and of the
+    position of the row).
+    """
+    x = np.uint64(zlib.crc32(name.encode())) << np.uint64(32)
+    x = (
+        x
+        + np.arange(first, first + size, dtype=np.uint64)
+        + np.uint64(0x9E3779B97F4A7C15)
+    )
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+
+    return x ^ (x >> np.uint64(31))
+
+
+def bottom_k(sample: pd.DataFrame, size: int) -> pd.DataFrame:
+    """
+    The 'size' calls of each day with the smallest hashes, a random sample of the day.
+    Kept from several samples, they are the ones kept from all their calls at once: the
+    samples of the chunks, and of the files, are merged this way.
+    """
+    return sample.sort_values("hash", kind="stable").groupby("day").head(size)
+
+
+def sample_calls(
+    dataset: pd.DataFrame, name: str, first: int, size: int, sample: pd.DataFrame = None
+) -> pd.DataFrame:
+    # The sample of the file 'name' read so far, with the chunk 'dataset' starting at
+    # its row 'first'.
+    hashes = row_hashes(name, first, len(dataset))
+    kept = bottom_k(
+        pd.DataFrame({"day": dataset.day.values, "hash": hashes}), size
+    ).index
+    calls = dataset.iloc[kept][SAMPLE_COLUMNS].assign(hash=hashes[kept])
+
+    return bottom_k(pd.concat([sample, calls], ignore_index=True), size)
+
+
+def sample_path(save_path: str, part: str, name: str = None) -> str:
+    # The sampled 'calls' or the numbers of calls of the 'days', of the file 'name' or
+    # of the whole dataset.
+    if name is None:
+        return os.path.join(save_path, SAMPLE, f"{part}.parquet")
+
+    return os.path.join(save_path, SAMPLE, "files", f"{name}.{part}.parquet")
+
+
+def write_sample(
+    save_path: str, name: str, sample: pd.DataFrame, days: pd.Series
+) -> None:
+    os.makedirs(os.path.join(save_path, SAMPLE, "files"), exist_ok=True)
+
+    sample.to_parquet(sample_path(save_path, "calls", name), index=False)
+    days.astype(np.int64).rename_axis("day").rename("calls").reset_index().to_parquet(
+        sample_path(save_path, "days", name), index=False
+    )
+
+
+def merge_samples(save_path: str, size: int) -> None:
+    """
+    The sample of the whole dataset, from the samples of its files: the 'size' calls
+    of each day with the smallest hashes, and the number of calls of each day.
+    """
+    parts = {
+        part: [
+            pd.read_parquet(path)
+            for path in sorted(glob.glob(sample_path(save_path, part, "*")))
+        ]
+        for part in ("calls", "days")
+    }
+
+    if not parts["calls"]:
+        for part in parts:
+            if os.path.exists(sample_path(save_path, part)):
+                os.remove(sample_path(save_path, part))
+        return
+
+    # The files may not share the same categories.
+    sample = bottom_k(pd.concat(parts["calls"], ignore_index=True), size)
+    tables = {
+        "calls": sample.astype({"desc": "category", "place": "category"}),
+        "days": pd.concat(parts["days"]).groupby("day", as_index=False).calls.sum(),
+    }
+
+    # Replaced at once, the dashboard never reads half a file.
+    for part, table in tables.items():
+        path = sample_path(save_path, part)
+        table.to_parquet(f"{path}.tmp", index=False)
+        os.replace(f"{path}.tmp", path)
+
+
+def shard_name(file: str) -> str:
+    return os.path.basename(file).split(".")[0]
+
+
+def remove_calls(save_path: str, name: str) -> None:
+    for path in glob.glob(os.path.join(save_path, "month=*", f"{name}-*.parquet")):
+        os.remove(path)
+
+    for part in ("calls", "days"):
+        if os.path.exists(sample_path(save_path, part, name)):
+            os.remove(sample_path(save_path, part, name))
+
+    if os.path.exists(counts_path(save_path, name)):
+        os.remove(counts_path(save_path, name))
+
+    for folder in glob.glob(os.path.join(save_path, "month=*")):
+        if not os.listdir(folder):
+            os.rmdir(folder)
+
+
+def file_sha256(file: str) -> str:
+    sha256 = hashlib.sha256()
+
+    with open(file, "rb") as f:
+        for block in iter(lambda: f.read(1024**2), b""):
+            sha256.update(block)
+
+    return sha256.hexdigest()
+
+
+def file_signature(file: str, previous: dict = None) -> dict:
+    """
+    The signature of 'file' in the manifest. The file is only hashed when its size or
+    its modification time changed since its 'previous' signature.
+    """
+    stat = os.stat(file)
+    if (
+        previous
+        and previous.get("size") == stat.st_size
+        and previous.get("mtime") == stat.st_mtime_ns
+    ):
+        sha256 = previous["sha256"]
+    else:
+        sha256 = file_sha256(file)
+
+    # A file ingested before a new frequency or format was added is read again.
+    return {
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "sha256": sha256,
+        "frequencies": FREQUENCIES,
+        "format": CALLS_FORMAT,
+    }
+
+
+def same_content(signature: dict, previous: dict) -> bool:
+    # A file which was only touched is not read again.
+    def content(signature):
+        return {key: value for key, value in signature.items() if key != "mtime"}
+
+    return previous is not None and content(signature) == content(previous)
+
+
+def read_manifest(save_path: str) -> dict:
+    try:
+        with open(os.path.join(save_path, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_manifest(save_path: str, manifest: dict) -> None:
+    os.makedirs(save_path, exist_ok=True)
+
+    with open(os.path.join(save_path, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+
+
+def ingest_calls(
+    file: str,
+    save_path: str,
+    keywords: dict = PLACE_KEYWORDS,
+    memory_limit: int = None,
+    lock=None,
+    sample_size: int = SAMPLE_SIZE,
+) -> None:
+    name = shard_name(file)
+    lock = lock or threading.Lock()
+    sample, days, first = None, pd.Series(dtype=np.int64), 0
+
+    for i, chunk in enumerate(read_calls_chunks(file, keywords, memory_limit)):
+        if len(chunk):
+            chunk = shared_categories(chunk, save_path, lock)
+            if sample_size:
+                sample = sample_calls(chunk, name, first, sample_size, sample)
+                days = days.add(chunk.day.value_counts(), fill_value=0)
+            append_calls(chunk, save_path, f"{name}-{i:05d}")
+            first += len(chunk)
+
+    if sample is not None:
+        write_sample(save_path, name, sample, days)
+
+
+def generate_data_NYPD_calls(
+    file_format: str,
+    save_path: str,
+    keywords: dict = PLACE_KEYWORDS,
+    workers: int = 1,
+    memory_limit: int = None,
+    incremental: bool = False,
+    sample_size: int = SAMPLE_SIZE,
+) -> None:
+    # The files written in the dataset are named after the source file and the chunk,
+    # so the rows are always read back in the same order, whatever the number of workers.
+    all_files = sorted(glob.glob(file_format))
+
+    if incremental:
+        manifest = read_manifest(save_path)
+    else:
+        manifest = {}
+        shutil.rmtree(save_path, ignore_errors=True)
+
+    # A file sampled with another size is read again.
+    signatures = {
+        os.path.basename(file): {
+            **file_signature(file, manifest.get(os.path.basename(file))),
+            "sample_size": sample_size,
+        }
+        for file in all_files
+    }
+
+    # Only the new or modified files are read, the rows of the modified or deleted
+    # files are removed from the dataset first.
+    all_files = [
+        file
+        for file in all_files
+        if not same_content(
+            signatures[os.path.basename(file)], manifest.get(os.path.basename(file))
+        )
+    ]
+    for name in (manifest.keys() - signatures.keys()) | set(
+        map(os.path.basename, all_files)
+    ):
+        remove_calls(save_path, shard_name(name))
+
+    if workers > 1 and len(all_files) > 1:
+        # The memory limit is shared between the workers.
+        memory_limit = memory_limit and memory_limit // workers
+
+        # The workers add the new categories to the dictionary one at a time.
+        with multiprocessing.Manager() as manager, ProcessPoolExecutor(
+            max_workers=workers
+        ) as executor:
+            list(
+                executor.map(
+                    ingest_calls,
+                    all_files,
+                    repeat(save_path),
+                    repeat(keywords),
+                    repeat(memory_limit),
+                    repeat(manager.Lock()),
+                    repeat(sample_size),
+                )
+            )
+    else:
+        for file in all_files:
+            ingest_calls(file, save_path, keywords, memory_limit, None, sample_size)
+
+    merge_samples(save_path, sample_size)
+    write_manifest(save_path, signatures)
 
 
 def generate_data_weather(file_format: str, save_path: str) -> None:
+    # The first column of the CSV is its index, a row number.
     dataset = pd.read_csv(
-        file_format, parse_dates=["date"], index_col=["date"], compression="zip"
-    )
+        file_format, parse_dates=["date"], index_col=0, compression="zip"
+    ).set_index("date")
 
     dataset = dataset.drop(columns=["tsun", "wpgt"]).ffill()
 
-    dataset.to_pickle(save_path)
+    dataset.to_parquet(save_path)
 
 
-def generate_data() -> None:
-    generate_data_NYPD_calls("NYPD_calls_*.csv.zip", "NYPD_calls.pkl")
-    generate_data_weather("weather.csv.zip", "weather.pkl")
+def grouped_batches(batches: Iterator[pa.RecordBatch], rows: int) -> Iterator[pa.Table]:
+    # The files are often small, their batches are counted 'rows' rows at a time.
+    group, size = [], 0
+    for batch in batches:
+        group.append(batch)
+        size += len(batch)
+        if size >= rows:
+            yield pa.Table.from_batches(group).unify_dictionaries()
+            group, size = [], 0
+
+    if group:
+        yield pa.Table.from_batches(group).unify_dictionaries()
+
+
+def shared_codes(column: pa.ChunkedArray, values: list) -> np.ndarray:
+    # The codes of a text column in the dictionary ('values'), -1 for a missing value.
+    column = column.combine_chunks()
+    if not pa.types.is_dictionary(column.type):
+        column = column.dictionary_encode()
+
+    positions = pd.Index(values).get_indexer(column.dictionary.to_pandas())
+    return np.append(positions, -1)[column.indices.fill_null(-1).to_numpy()]
+
+
+def count_calls(save_path: str, name: str) -> dict:
+    """
+    Number of calls of the file 'name' per bucket, description and place, for each
+    frequency (see 'helpers.buckets.sparse_counts'). The calls are read batch by batch,
+    only the counts are kept in memory.
+    """
+    dictionary = read_dictionary(save_path)
+    files = glob.glob(os.path.join(save_path, "month=*", f"{name}-*.parquet"))
+    counts = dict.fromkeys(FREQUENCIES, NO_COUNTS)
+
+    batches = (
+        ds.dataset(files, format="parquet").to_batches(
+            columns=["desc", "place", *map(bucket_column, FREQUENCIES)]
+        )
+        if files
+        else []
+    )
+    for table in grouped_batches(batches, COUNT_ROWS):
+        desc = shared_codes(table.column("desc"), dictionary["desc"])
+        place = shared_codes(table.column("place"), dictionary["place"])
+        # The calls without description or place are not counted.
+        known = (desc >= 0) & (place >= 0)
+
+        # Added up as they are read: the counts are never larger than the cubes.
+        for freq in FREQUENCIES:
+            ids = table.column(bucket_column(freq)).to_numpy()[known]
+            counts[freq] = add_counts(
+                [counts[freq], sparse_counts([ids, desc[known], place[known]])]
+            )
+
+    return counts
+
+
+def counts_path(save_path: str, name: str) -> str:
+    return os.path.join(save_path, COUNTS, f"{name}.npz")
+
+
+def write_counts(save_path: str, name: str, counts: dict) -> None:
+    os.makedirs(os.path.join(save_path, COUNTS), exist_ok=True)
+
+    path = counts_path(save_path, name)
+    with open(f"{path}.tmp", "wb") as f:
+        np.savez(
+            f,
+            **{
+                f"{freq}_{column}": values
+                for freq, (ids, numbers) in counts.items()
+                for column, values in zip(
+                    ["bucket", "desc", "place", "number"], [*ids, numbers]
+                )
+            },
+        )
+    os.replace(f"{path}.tmp", path)
+
+
+def read_counts(save_path: str, name: str) -> dict:
+    with np.load(counts_path(save_path, name)) as arrays:
+        return {
+            freq: (
+                [arrays[f"{freq}_{column}"] for column in ["bucket", "desc", "place"]],
+                arrays[f"{freq}_number"],
+            )
+            for freq in FREQUENCIES
+        }
+
+
+def calls_counts(save_path: str) -> dict:
+    """
+    Number of calls of the whole dataset per bucket, description and place, for each
+    frequency. Each file is only counted once after it is ingested: the counts of the
+    files which did not change are read back.
+    """
+    counts = dict.fromkeys(FREQUENCIES, NO_COUNTS)
+
+    for name in sorted(map(shard_name, read_manifest(save_path))):
+        if not os.path.exists(counts_path(save_path, name)):
+            write_counts(save_path, name, count_calls(save_path, name))
+
+        for freq, file_counts in read_counts(save_path, name).items():
+            counts[freq] = add_counts([counts[freq], file_counts])
+
+    return counts
+
+
+def generate_data_aggregates(
+    calls_path: str, weather_path: str, save_path: str
+) -> None:
+    # Added up from the counts of every file, so it is right after an incremental run.
+    counts = calls_counts(calls_path)
+    weather = pd.read_parquet(weather_path)
+
+    build_aggregates(counts, read_dictionary(calls_path), weather, save_path)
+
+
+def generate_data(
+    workers: int = 1,
+    memory_limit: int = None,
+    incremental: bool = False,
+    sample_size: int = SAMPLE_SIZE,
+) -> None:
+    generate_data_NYPD_calls(
+        "NYPD_calls_*.csv.zip",
+        "NYPD_calls",
+        workers=workers,
+        memory_limit=memory_limit,
+        incremental=incremental,
+        sample_size=sample_size,
+    )
+    generate_data_weather("weather.csv.zip", "weather.parquet")
+    generate_data_aggregates("NYPD_calls", "weather.parquet", "aggregates")
 
 
 if __name__ == "__main__":
-    generate_data()
+    parser = argparse.ArgumentParser(
+        description="Generate the datasets of the project."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes used to read the NYPD calls files",
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=int,
+        default=None,
+        help="memory in MB used to read the NYPD calls files, which are then streamed "
+        "chunk by chunk instead of being read at once",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only read the NYPD calls files which are new or modified since the last run",
+    )
+    parser.add_argument(
+        "--sample-size",
+        type=int,
+        default=SAMPLE_SIZE,
+        help="calls of each day kept in the sample of the approximate mode, like 200 "
+        "(0: no sample)",
+    )
+    args = parser.parse_args()
+
+    generate_data(
+        workers=args.workers,
+        memory_limit=args.memory_limit and args.memory_limit * 1024**2,
+        incremental=args.incremental,
+        sample_size=args.sample_size,
+    )
@@ -0,0 +1,48 @@
+from functools import partial
+from dash import Patch
+from helpers.approximate import approximate_panel
+from helpers.cache import cached_data
+from helpers.queries import known, load_panel
+
+
+def bars_data(freq, dim, approximate=False):
+    # One row per date of the slider (the dates of the weather), even without any call,
+    # and one column per value of 'dim' ('desc' or 'place').
+    # Estimated from the sample, the numbers come with their errors.
+    panel, errors = approximate_panel(freq) if approximate else (load_panel(freq), None)
+    dates = known(panel, "weather")
+    data = panel[dim][dates].fillna(0).round().astype(int).rename_axis(columns=dim)
+
+    if errors is None:
+        return data, data.values.max(), None
+
+    errors = errors[dim][dates].reindex(columns=data.columns).fillna(0).round()
+    return data, (data + errors).values.max(), errors
+
+
+def bars_table(freq, dim, approximate=False):
+    """
+    The heights of the bars of 'dim' for every date, the top of their axis and their
+    errors (None unless 'approximate').
+    """
+    name = f"bars_{dim}_approximate" if approximate else f"bars_{dim}"
+    return cached_data(name, partial(bars_data, dim=dim, approximate=approximate), freq)
+
+
+def bars_patch(freq, dim, value, approximate=False, split=False):
+    # Only the bars change when the slider moves. With 'split', each value of 'dim'
+    # has its own trace, with a single bar.
+    data, _, errors = bars_table(freq, dim, approximate)
+
+    def traces(values):
+        return enumerate([[value] for value in values]) if split else [(0, values)]
+
+    patch = Patch()
+    for i, numbers in traces(data.loc[value].tolist()):
+        patch["data"][i]["y"] = numbers
+    if errors is not None:
+        for i, error in traces(errors.loc[value].tolist()):
+            patch["data"][i]["error_y"]["array"] = error
+            patch["data"][i]["customdata"] = error
+
+    return patch
@@ -1,10 +1,9 @@
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from helpers.utils import (
-    load_weather_data,
-    load_calls_correlation_data,
-    remove_outliers,
-)
+from helpers.analytics import analytics
+from helpers.downsample import downsample
+from helpers.outliers import clean_series
+from helpers.utils import FREQUENCY_NAMES, HOVER_FORMATS, WEEK_HOUR_AXIS
 
 from helpers.design import (
     background_color,
@@ -14,34 +13,32 @@ from helpers.design import (
     color_green,
 )
 
-# import numpy as np
-
-calls = load_calls_correlation_data()
-weather = load_weather_data()
-
 
-def display_correlation_plot(freq="M"):
-    nb_calls = remove_outliers(calls.resample(freq).size())
-    avg = remove_outliers(weather.tavg.resample(freq).mean())
-    # corr = np.corrcoef(nb_calls, avg)[0][1]
+def display_correlation_plot(freq="M", start=None, end=None):
+    # Only the dates between 'start' and 'end' (all of them when None) are drawn.
+    nb_calls = downsample(clean_series("total", freq)[start:end])
+    avg = downsample(clean_series("tavg", freq)[start:end])
+    results = analytics(freq)["figures"]
+    pearson, spearman = results["pearson"], results["spearman"]
 
     fig = make_subplots(specs=[[{"secondary_y": True}]])
 
     # Add traces
     fig.add_trace(
         go.Scatter(x=nb_calls.index, y=nb_calls, line_color=color_blue, name="Appels",
-                   hovertemplate="%{y} appels le %{x:%d/%m/%y}"),
+                   hovertemplate=f"%{{y}} appels le %{{x:{HOVER_FORMATS[freq]}}}"),
         secondary_y=False,
     )
 
     fig.add_trace(
-        go.Scatter(x=nb_calls.index, y=avg, line_color=color_green, name="Température",
-                   hovertemplate="%{y}°C le %{x:%d/%m/%y}"),
+        go.Scatter(x=avg.index, y=avg, line_color=color_green, name="Température",
+                   hovertemplate=f"%{{y}}°C le %{{x:{HOVER_FORMATS[freq]}}}"),
         secondary_y=True,
     )
 
     # Add figure title
     fig.update_layout(
+        title_text=f"Corrélation de Pearson : {pearson:.2f}, de Spearman : {spearman:.2f}",
         margin=dict(l=10, r=10, b=10, t=50, pad=2),
         legend=dict(yanchor="top", y=0.99, xanchor="left", x=0.01),
         plot_bgcolor=background_color,
@@ -53,8 +50,12 @@ def display_correlation_plot(freq="M"):
 
     # Set x-axis title
     fig.update_xaxes(title_text="Date")
+    if start is not None:
+        fig.update_xaxes(range=[start, end])
+    if freq == "HW":
+        fig.update_xaxes(**WEEK_HOUR_AXIS)
 
-    frequency = "mois" if freq == "M" else "semaine" if freq == "W" else "jour"
+    frequency = FREQUENCY_NAMES[freq]
 
     # Set y-axes titles
     fig.update_yaxes(
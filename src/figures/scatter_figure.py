@@ -1,8 +1,5 @@
-from helpers.utils import (
-    load_calls_correlation_data,
-    load_weather_data,
-    remove_outliers,
-)
+from helpers.analytics import analytics
+from helpers.utils import FREQUENCY_NAMES
 
 from helpers.design import (
     background_color,
@@ -12,28 +9,25 @@ from helpers.design import (
     color_green,
 )
 
+import numpy as np
 import plotly.express as px
-
-calls = load_calls_correlation_data()
-weather = load_weather_data()
+import plotly.graph_objects as go
 
 
 def display_correlation_scatter(freq="M", size_value=0):
-    nb_calls = remove_outliers(calls.resample(freq).size())
-    tavg = remove_outliers(weather.tavg.resample(freq).mean())
-    prcp = remove_outliers(weather.prcp.resample(freq).mean())
-    wspd = remove_outliers(weather.wspd.resample(freq).mean())
+    results = analytics(freq)["figures"]
+
+    nb_calls = results["total"]
+    tavg = results["tavg"]
 
-    size_values = [prcp, wspd]
+    size_values = [results["prcp"], results["wspd"]]
     hover_text = ["mm de précipitation", "km/h de vent"]
 
     fig = px.scatter(
         x=tavg,
         y=nb_calls,
-        trendline="ols",
         size=size_values[size_value],
         color_discrete_sequence=[color_blue],
-        trendline_color_override=color_green,
     )
 
     fig.update_traces(
@@ -41,7 +35,23 @@ def display_correlation_scatter(freq="M", size_value=0):
         + hover_text[size_value]
     )
 
-    frequency = "mois" if freq == "M" else "semaine" if freq == "W" else "jour"
+    # The regression line is fitted once per frequency by 'helpers.analytics'.
+    slope, intercept = results["slope"], results["intercept"]
+    r2 = results["pearson"] ** 2
+    x = np.array([tavg.min(), tavg.max()])
+
+    fig.add_trace(
+        go.Scatter(
+            x=x,
+            y=intercept + slope * x,
+            mode="lines",
+            line_color=color_green,
+            showlegend=False,
+            hovertemplate=f"{slope:.2f} appels par °C<br>R² = {r2:.2f}<extra></extra>",
+        )
+    )
+
+    frequency = FREQUENCY_NAMES[freq]
 
     fig.update_xaxes(title_text=f"Température moyenne par {frequency}")
     fig.update_yaxes(title_text=f"Nombre d'appels par {frequency}")
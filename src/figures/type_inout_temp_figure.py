@@ -1,45 +1,35 @@
-from helpers.utils import load_calls_correlation_data
+from figures.bars import bars_patch, bars_table
+from helpers.approximate import APPROXIMATE_TITLE
+from helpers.utils import FREQUENCY_NAMES
 import plotly.express as px
 from helpers.design import background_color, font_color, font_family, color_blue
 
-calls = load_calls_correlation_data()
 
+def in_out_of_calls(freq="M", value=None, approximate=False):
+    data, max_size, errors = bars_table(freq, "place", approximate)
 
-class DataManager:
-    dataframe = {}
-    max_size = {}
-
-
-def in_out_of_calls(freq="M", value=None):
-    data = DataManager.dataframe.get(freq)
-
-    if data is None:
-        data = (
-            calls.groupby(["place", 'date'])
-            .size()
-            .reset_index(0)
-            .groupby(["place"])
-            .resample(freq)
-            .sum()
-            .reset_index(0)
-            .rename(columns={0: "number"})
-        )
-
-        DataManager.max_size[freq] = data.number.max()
-        DataManager.dataframe[freq] = data
-
-    fig = px.bar(data.loc[value], x="place", y="number", color='place')
+    fig = px.bar(x=data.columns, y=data.loc[value], color=data.columns)
 
     fig.update_traces(hovertemplate="Lieu: %{x}<br>%{y:.2f} appels")
 
-    frequency = "mois" if freq == "M" else "semaine" if freq == "W" else "jour"
+    if errors is not None:
+        # One trace per place, each with its own error.
+        for trace, error in zip(fig.data, errors.loc[value].tolist()):
+            trace.update(
+                error_y=dict(type="data", array=[error]),
+                customdata=[error],
+                hovertemplate="Lieu: %{x}<br>≈%{y} ± %{customdata} appels",
+            )
+        fig.update_layout(title_text=APPROXIMATE_TITLE)
+
+    frequency = FREQUENCY_NAMES[freq]
 
     fig.update_yaxes(title_text=f"Nombre d'appels par {frequency}")
     fig.update_xaxes(title_text="Lieux")
 
     fig.update_layout(
         showlegend=False,
-        yaxis_range=[0, DataManager.max_size[freq]],
+        yaxis_range=[0, max_size],
         margin=dict(l=10, r=10, b=10, t=50, pad=4),
         plot_bgcolor=background_color,
         paper_bgcolor=background_color,
@@ -49,3 +39,8 @@ def in_out_of_calls(freq="M", value=None):
     )
 
     return fig
+
+
+def in_out_of_calls_patch(freq="M", value=None, approximate=False):
+    # There is one trace per place.
+    return bars_patch(freq, "place", value, approximate, split=True)
@@ -0,0 +1,33 @@
+from figures.bars import bars_table
+from figures.types_figure import types_of_calls
+from figures.type_inout_temp_figure import in_out_of_calls
+from helpers.approximate import weather_dates
+from helpers.utils import format_date, format_label
+
+
+def types_animation(freq="M", approximate=False):
+    """
+    Everything needed to play the animation of the 'Type et lieu' figures in the
+    browser: the figures of the first date and the bar heights of every date, with
+    their errors when they are estimated from the sample.
+    """
+    index = weather_dates(freq)
+    dates = [format_date(date, freq) for date in index]
+
+    types, _, desc_errors = bars_table(freq, "desc", approximate)
+    in_out, _, place_errors = bars_table(freq, "place", approximate)
+
+    frames = {
+        "dates": dates,
+        "labels": [format_label(date, freq) for date in index],
+        "types": types_of_calls(freq, dates[0], approximate),
+        "in_out": in_out_of_calls(freq, dates[0], approximate),
+        "desc": types.reindex(index, fill_value=0).values.tolist(),
+        "place": in_out.reindex(index, fill_value=0).values.tolist(),
+    }
+
+    if approximate:
+        frames["desc_error"] = desc_errors.reindex(index, fill_value=0).values.tolist()
+        frames["place_error"] = place_errors.reindex(index, fill_value=0).values.tolist()
+
+    return frames
@@ -1,54 +1,45 @@
 import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
+from figures.bars import bars_patch, bars_table
 from helpers.design import background_color, font_color, font_family, color_green, color_blue
-from helpers.utils import load_calls_correlation_data, load_weather_data
+from helpers.approximate import APPROXIMATE_TITLE, weather_dates
+from helpers.cache import cached_data
+from helpers.downsample import downsample
+from helpers.queries import mean_weather
+from helpers.utils import FREQUENCY_NAMES, HOVER_FORMATS, WEEK_HOUR_AXIS
 
-calls = load_calls_correlation_data()
-weather = load_weather_data()
 
+def temperature(freq):
+    # The temperature on the dates of the slider is only a landmark, it is always
+    # downsampled.
+    return downsample(mean_weather(freq).tavg.loc[weather_dates(freq)])
 
-class DataManager:
-    dataframe = {}
-    max_size = {}
-    weather_data = {}
 
-
-def types_of_calls(freq="M", value=None):
-    data = DataManager.dataframe.get(freq)
-    weather_data = DataManager.weather_data.get(freq)
-
-    if data is None:
-        data = (
-            calls.groupby(["desc", 'date'])
-                .size()
-                .reset_index(0)
-                .groupby(["desc"])
-                .resample(freq)
-                .sum()
-                .reset_index(0)
-                .rename(columns={0: "number"})
-        )
-
-        weather_data = weather.tavg.resample(freq).mean()
-
-        DataManager.max_size[freq] = data.number.max()
-        DataManager.dataframe[freq] = data
-        DataManager.weather_data[freq] = weather_data
+def types_of_calls(freq="M", value=None, approximate=False):
+    data, max_size, errors = bars_table(freq, "desc", approximate)
+    weather_data = cached_data("temperature", temperature, freq)
 
     fig = make_subplots(specs=[[{"secondary_y": True}]])
-    fig.add_trace(go.Bar(x=data.loc[value].desc,
-                         y=data.loc[value].number,
+    fig.add_trace(go.Bar(x=data.columns,
+                         y=data.loc[value],
                          marker_color=px.colors.qualitative.Plotly,
                          name="Catégories",
                          hovertemplate="%{y} appels pour '%{x}'"), secondary_y=False)
 
+    if errors is not None:
+        fig.data[0].update(error_y=dict(type="data", array=errors.loc[value]),
+                           customdata=errors.loc[value],
+                           hovertemplate="≈%{y} ± %{customdata} appels pour '%{x}'")
+        fig.update_layout(title_text=APPROXIMATE_TITLE)
+
     fig.add_trace(go.Scatter(x=weather_data.index,
                              y=weather_data,
                              line_color=color_green,
                              line_width=0.8,
                              name="Température",
-                             hovertemplate="%{y}°C le %{x:%d/%m/%y}"), secondary_y=True)
+                             hovertemplate=f"%{{y}}°C le %{{x:{HOVER_FORMATS[freq]}}}"),
+                  secondary_y=True)
 
     fig.add_vline(x=value, line_color=color_green, line_width=0.8, secondary_y=True)
 
@@ -58,7 +49,7 @@ def types_of_calls(freq="M", value=None):
     # Set x-axis title
     fig.update_xaxes(title_text="Catégories")
 
-    frequency = "mois" if freq == "M" else "semaine" if freq == "W" else "jour"
+    frequency = FREQUENCY_NAMES[freq]
 
     # Set y-axes titles
     fig.update_yaxes(title_text=f"Nombre d'appels par {frequency}", secondary_y=False)
@@ -68,7 +59,7 @@ def types_of_calls(freq="M", value=None):
         xaxis2={'anchor': 'y', 'overlaying': 'x', 'side': 'top'},
         yaxis_domain=[0, 0.94],
         margin=dict(l=10, r=10, b=10, t=50, pad=4),
-        yaxis_range=[0, DataManager.max_size[freq]],
+        yaxis_range=[0, max_size],
         legend=dict(yanchor="top", y=0.94, xanchor="left", x=0.01),
         plot_bgcolor=background_color,
         paper_bgcolor=background_color,
@@ -77,4 +68,16 @@ def types_of_calls(freq="M", value=None):
         font_color=font_color,
     )
 
+    if freq == "HW":
+        fig.update_layout(xaxis2=WEEK_HOUR_AXIS)
+
     return fig
+
+
+def types_of_calls_patch(freq="M", value=None, approximate=False):
+    # The bars and the vertical line change when the slider moves.
+    patch = bars_patch(freq, "desc", value, approximate)
+    patch["layout"]["shapes"][0]["x0"] = value
+    patch["layout"]["shapes"][0]["x1"] = value
+
+    return patch
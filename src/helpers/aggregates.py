@@ -0,0 +1,261 @@
+"""
+The aggregates are computed once by 'data/get_data.py' and saved in the folder
+'data/aggregates' as NumPy arrays. For each frequency (month, week, day, hour and
+hour of the week), there are:
+	- dates_{freq}.npy: the dates of the calls.
+	- calls_{freq}.npy: the number of calls per date, description and place.
+	- desc_{freq}.npy, place_{freq}.npy: the number of calls per date and description/place.
+	- total_{freq}.npy: the number of calls per date.
+	- weather_dates_{freq}.npy, weather_{freq}.npy: the mean of the weather per date.
+	- panel_dates_{freq}.npy, panel_{freq}.npy: the numbers of calls and the weather
+	joined on the same dates (see 'join_panel'), as one table.
+The file 'labels.json' contains the descriptions, the places and the weather columns.
+
+With the default backend of 'helpers.queries', the dashboard only reads these
+files, the calls themselves are never loaded.
+They are registered in 'helpers.registry' and read the first time they are needed.
+The arrays are memory-mapped and never copied, so all the workers of the dashboard
+share the same pages of memory.
+"""
+
+
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from functools import partial
+
+from helpers import registry
+from helpers.buckets import bucket_ids, bucket_labels, count, mean
+
+
+AGGREGATES_PATH = "data/aggregates"
+FREQUENCIES = ["M", "W", "D", "H", "HW"]
+
+
+def save_array(save_path, name, values):
+    # Written next to the old file then renamed, the workers which still map the old
+    # file keep reading it until they are restarted.
+    path = os.path.join(save_path, name)
+    np.save(path + ".tmp.npy", np.ascontiguousarray(values))
+    os.replace(path + ".tmp.npy", path + ".npy")
+
+
+def used_values(values, codes):
+    # The categories of the calls dataset are in the order they were first met and
+    # keep the values of the removed files: only the ones used are kept, sorted. Their
+    # positions in the sorted list, by code (-1 when not used).
+    order = sorted(np.unique(codes), key=lambda code: values[code])
+    positions = np.full(len(values), -1)
+    positions[order] = np.arange(len(order))
+
+    return [values[code] for code in order], positions
+
+
+def hourly_weather(weather):
+    # The weather is daily, each hour of a day gets the values of the day. The means
+    # per month, week or day are the same as with the days.
+    times = (
+        weather.index.values.astype("datetime64[D]")[:, None]
+        + np.arange(24).astype("timedelta64[h]")
+    ).ravel()
+    return pd.DataFrame(
+        np.repeat(weather.values.astype(float), 24, axis=0),
+        index=pd.DatetimeIndex(times, name="date"),
+        columns=weather.columns,
+    )
+
+
+def panel_columns(desc, place, weather):
+    return pd.MultiIndex.from_tuples(
+        [("total", "total")]
+        + [("desc", value) for value in desc]
+        + [("place", value) for value in place]
+        + [("weather", value) for value in weather],
+        names=["dim", "value"],
+    )
+
+
+def join_panel(total, desc, place, weather):
+    """
+    The number of calls (total, per description and per place) and the weather joined
+    on their dates, as one table of floats whose columns are (dim, value): ('total',
+    'total'), ('desc', 'Assault'), ..., ('weather', 'tavg'), ... The calls are NaN on
+    the dates of the weather without calls, and the weather on the dates without it.
+    """
+    panel = pd.concat(
+        [total.rename("total").to_frame(), desc, place, weather],
+        axis=1,
+        keys=["total", "desc", "place", "weather"],
+    ).astype(float)
+    panel.columns = panel_columns(desc.columns, place.columns, weather.columns)
+    panel.index.name = "date"
+
+    return panel
+
+
+def build_aggregates(
+    counts, dictionary, weather, save_path=AGGREGATES_PATH, frequencies=FREQUENCIES
+):
+    """
+    'counts' are the numbers of calls of each frequency per bucket, description and
+    place, as given by 'helpers.buckets.sparse_counts': {freq: ([bucket ids, desc
+    codes, place codes], numbers)}. The codes are the positions of the values in the
+    lists 'desc' and 'place' of 'dictionary', the categories of the calls dataset
+    written by 'data/get_data.py'. Only the aggregates of 'frequencies' are written.
+    """
+    os.makedirs(save_path, exist_ok=True)
+
+    # Every frequency counts the same calls, with the same descriptions and places.
+    (_, desc_codes, place_codes), _ = counts[frequencies[0]]
+    desc, desc_positions = used_values(dictionary["desc"], desc_codes)
+    place, place_positions = used_values(dictionary["place"], place_codes)
+
+    labels = {"desc": desc, "place": place, "weather": list(weather.columns)}
+
+    hourly = hourly_weather(weather)
+
+    for freq in frequencies:
+        (ids, desc_codes, place_codes), numbers = counts[freq]
+        first, size = ids.min(), ids.max() - ids.min() + 1
+
+        # Every description and place is kept for every date, even without any call.
+        cube = count(
+            [ids - first, desc_positions[desc_codes], place_positions[place_codes]],
+            [size, len(labels["desc"]), len(labels["place"])],
+            numbers,
+        ).astype(np.int64)
+
+        weather_ids = bucket_ids(hourly.index.values, freq)
+        weather_first = weather_ids.min()
+        weather_size = weather_ids.max() - weather_first + 1
+        weather_means = np.column_stack(
+            [
+                mean(weather_ids - weather_first, values, weather_size)
+                for values in hourly.values.T
+            ]
+        )
+
+        dates = bucket_labels(first + np.arange(size), freq)
+        weather_dates = bucket_labels(weather_first + np.arange(weather_size), freq)
+        panel = join_panel(
+            pd.Series(cube.sum(axis=(1, 2)), index=dates),
+            pd.DataFrame(cube.sum(axis=2), index=dates, columns=labels["desc"]),
+            pd.DataFrame(cube.sum(axis=1), index=dates, columns=labels["place"]),
+            pd.DataFrame(weather_means, index=weather_dates, columns=labels["weather"]),
+        )
+
+        save_array(save_path, f"dates_{freq}", dates.values)
+        save_array(save_path, f"calls_{freq}", cube)
+        save_array(save_path, f"desc_{freq}", cube.sum(axis=2))
+        save_array(save_path, f"place_{freq}", cube.sum(axis=1))
+        save_array(save_path, f"total_{freq}", cube.sum(axis=(1, 2)))
+        save_array(save_path, f"weather_dates_{freq}", weather_dates.values)
+        save_array(save_path, f"weather_{freq}", weather_means)
+        save_array(save_path, f"panel_dates_{freq}", panel.index.values)
+        save_array(save_path, f"panel_{freq}", panel.values)
+
+    with open(os.path.join(save_path, "labels.json"), "w") as f:
+        json.dump(labels, f, indent=4, ensure_ascii=False)
+
+
+def read_array(name):
+    return np.load(os.path.join(AGGREGATES_PATH, f"{name}.npy"), mmap_mode="r")
+
+
+def read_labels():
+    with open(os.path.join(AGGREGATES_PATH, "labels.json")) as f:
+        return json.load(f)
+
+
+def read_dates(name):
+    return pd.DatetimeIndex(read_array(name), name="date")
+
+
+def read_calls_by(freq, dim):
+    return pd.DataFrame(
+        read_array(f"{dim}_{freq}"),
+        index=registry.get(f"dates_{freq}"),
+        columns=pd.Index(registry.get("labels")[dim], name=dim),
+        copy=False,
+    )
+
+
+def read_calls_total(freq):
+    return pd.Series(
+        read_array(f"total_{freq}"),
+        index=registry.get(f"dates_{freq}"),
+        name="number",
+        copy=False,
+    )
+
+
+def read_weather_means(freq):
+    return pd.DataFrame(
+        read_array(f"weather_{freq}"),
+        index=read_dates(f"weather_dates_{freq}"),
+        columns=registry.get("labels")["weather"],
+        copy=False,
+    )
+
+
+def read_panel(freq):
+    labels = registry.get("labels")
+    return pd.DataFrame(
+        read_array(f"panel_{freq}"),
+        index=read_dates(f"panel_dates_{freq}"),
+        columns=panel_columns(labels["desc"], labels["place"], labels["weather"]),
+        copy=False,
+    )
+
+
+def load_calls_cube(freq="M"):
+    """
+    Number of calls per date, description and place, as an array of shape
+    (dates, descriptions, places).
+    """
+    return registry.get(f"calls_{freq}")
+
+
+def load_calls_total(freq="M"):
+    return registry.get(f"total_{freq}")
+
+
+def load_weather_means(freq="M"):
+    return registry.get(f"weather_{freq}")
+
+
+def read_data_version():
+    # Changes each time the aggregates are written again by 'data/get_data.py'.
+    files = sorted(os.scandir(AGGREGATES_PATH), key=lambda file: file.name)
+    return hashlib.sha1(
+        repr([(file.name, file.stat().st_mtime_ns) for file in files]).encode()
+    ).hexdigest()[:12]
+
+
+def data_version():
+    return registry.get("version")
+
+
+def calls_by(freq="M", dim="desc"):
+    """
+    Number of calls per date (rows) and per value of 'dim' (columns).
+    """
+    return registry.get(f"{dim}_{freq}")
+
+
+# The warm-up reads the monthly aggregates first, the frequency shown by default.
+registry.register("labels", read_labels)
+registry.register("version", read_data_version)
+for priority, freq in enumerate(FREQUENCIES):
+    for name, loader in [
+        (f"dates_{freq}", partial(read_dates, f"dates_{freq}")),
+        (f"calls_{freq}", partial(read_array, f"calls_{freq}")),
+        (f"desc_{freq}", partial(read_calls_by, freq, "desc")),
+        (f"place_{freq}", partial(read_calls_by, freq, "place")),
+        (f"total_{freq}", partial(read_calls_total, freq)),
+        (f"weather_{freq}", partial(read_weather_means, freq)),
+        (f"panel_{freq}", partial(read_panel, freq)),
+    ]:
+        registry.register(name, loader, priority)
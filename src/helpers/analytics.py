@@ -0,0 +1,169 @@
+"""
+Regressions and correlations between the weather and the number of calls.
+
+For a frequency, every weather variable of 'WEATHER_VARIABLES' is compared at once
+with the total number of calls and with the number of calls per description and per
+place: the fits are a few matrix products on the whole table, nothing is fitted
+when a callback runs. The results are registered in 'helpers.registry', they are
+computed once per frequency, by the warm-up when it is enabled.
+
+The results are DataFrames whose rows are the weather variables and whose columns
+are the call counts, as (dim, value): ('total', 'total'), ('desc', 'Assault'), ...
+The numbers drawn by the figures, the fit of the total number of calls on the
+temperature and the series of the scatter plot, are also given as they are ('figures').
+"""
+
+
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from helpers import registry
+from helpers.aggregates import FREQUENCIES
+from helpers.outliers import clean_series
+from helpers.queries import known, load_panel
+
+
+WEATHER_VARIABLES = ["tavg", "prcp", "wspd", "snow", "pres"]
+
+# Number of dates of a rolling correlation, about a few months at each frequency.
+ROLLING_WINDOWS = {"M": 6, "W": 13, "D": 30, "H": 24 * 7, "HW": 24}
+
+TOTAL = ("total", "total")
+
+
+def aligned_data(freq="M"):
+    """
+    The weather and the number of calls on their common dates, without outliers. The
+    series are the ones of the figures (see 'helpers.outliers.clean_series').
+    """
+    panel = load_panel(freq)
+    dates = panel.index[known(panel, "total") & known(panel, "weather")]
+    calls = panel[["total", "desc", "place"]].columns
+
+    weather = pd.concat(
+        [clean_series(name, freq) for name in WEATHER_VARIABLES], axis=1
+    ).set_axis(WEATHER_VARIABLES, axis=1)
+    calls = pd.concat(
+        [
+            clean_series("total" if dim == "total" else (dim, value), freq)
+            for dim, value in calls
+        ],
+        axis=1,
+    ).set_axis(calls, axis=1)
+
+    return weather.reindex(dates), calls.reindex(dates)
+
+
+def centered(data):
+    values = data.values
+    return values - values.mean(axis=0)
+
+
+def linear_fit(x, y):
+    """
+    Least squares fit of every column of 'y' on every column of 'x', and the Pearson
+    correlation of each pair. Returns the slopes, intercepts and correlations.
+    """
+    x_centered, y_centered = centered(x), centered(y)
+
+    covariance = x_centered.T @ y_centered
+    x_squares = (x_centered**2).sum(axis=0)
+    y_squares = (y_centered**2).sum(axis=0)
+
+    # A constant column (no snow during a whole month...) has no fit, it gives NaN.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = covariance / x_squares[:, None]
+        correlation = covariance / np.sqrt(np.outer(x_squares, y_squares))
+
+    intercept = y.values.mean(axis=0) - slope * x.values.mean(axis=0)[:, None]
+
+    # Each frame gets its own columns: pandas fills the lookup caches of an index the
+    # first time it is used, without a lock, and the frames are read by several threads.
+    def frame(values):
+        return pd.DataFrame(
+            values, index=x.columns.copy(deep=True), columns=y.columns.copy(deep=True)
+        )
+
+    return frame(slope), frame(intercept), frame(correlation)
+
+
+def rolling_sums(values, window):
+    sums = np.cumsum(values, axis=0)
+    sums[window:] = sums[window:] - sums[:-window]
+    return sums[window - 1 :]
+
+
+def rolling_correlation(x, y, window):
+    """
+    Pearson correlation of every pair of columns of 'x' and 'y' on the last 'window'
+    dates, labelled by the last date like 'pandas.DataFrame.rolling'. The columns are
+    (weather, dim, value).
+    """
+    # Centered first, the sums of squares stay small and precise.
+    x_values = centered(x)[:, :, None]
+    y_values = centered(y)[:, None, :]
+
+    x_sums, y_sums = rolling_sums(x_values, window), rolling_sums(y_values, window)
+    covariance = rolling_sums(x_values * y_values, window) - x_sums * y_sums / window
+    x_variance = rolling_sums(x_values**2, window) - x_sums**2 / window
+    y_variance = rolling_sums(y_values**2, window) - y_sums**2 / window
+
+    # On the dates where a column is constant there is no correlation, the rounding
+    # errors of the sums would give any value.
+    x_variance[x_variance <= 1e-10 * window * (x_values**2).mean(axis=0)] = np.nan
+    y_variance[y_variance <= 1e-10 * window * (y_values**2).mean(axis=0)] = np.nan
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        correlation = covariance / np.sqrt(x_variance * y_variance)
+
+    columns = pd.MultiIndex.from_tuples(
+        [(variable, *column) for variable in x.columns for column in y.columns],
+        names=["weather", *y.columns.names],
+    )
+
+    return pd.DataFrame(
+        correlation.reshape(len(correlation), -1),
+        index=x.index[window - 1 :],
+        columns=columns,
+    )
+
+
+def compute_analytics(freq="M"):
+    weather, calls = aligned_data(freq)
+
+    slope, intercept, pearson = linear_fit(weather, calls)
+    _, _, spearman = linear_fit(weather.rank(), calls.rank())
+
+    # Looked up here once, before the results are shared: the figures read these on
+    # every build, from several threads, as floats and Series.
+    figures = {
+        "slope": float(slope.loc["tavg", TOTAL]),
+        "intercept": float(intercept.loc["tavg", TOTAL]),
+        "pearson": float(pearson.loc["tavg", TOTAL]),
+        "spearman": float(spearman.loc["tavg", TOTAL]),
+        "total": calls[TOTAL].copy(),
+        **{name: weather[name].copy() for name in ["tavg", "prcp", "wspd"]},
+    }
+
+    return {
+        "figures": figures,
+        "weather": weather,
+        "calls": calls,
+        "slope": slope,
+        "intercept": intercept,
+        "pearson": pearson,
+        "spearman": spearman,
+        "rolling": rolling_correlation(
+            weather, calls, min(ROLLING_WINDOWS[freq], len(weather))
+        ),
+    }
+
+
+def analytics(freq="M"):
+    return registry.get(f"analytics_{freq}")
+
+
+for priority, freq in enumerate(FREQUENCIES):
+    registry.register(f"analytics_{freq}", partial(compute_analytics, freq), priority)
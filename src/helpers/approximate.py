@@ -0,0 +1,189 @@
+"""
+Approximate mode (NYPD_APPROXIMATE=1), for the histories too long to be aggregated
+before the first user arrives: the figures are first drawn from a sample of the
+calls, with error bounds, and drawn again from the exact numbers as soon as they
+are computed in the background ('computed').
+
+The sample is written by 'data/get_data.py --sample-size n' in 'NYPD_calls/_sample':
+at most n calls of each day of the whole dataset, with the number of calls of each
+day. Each day is a stratum, sampled on its own. The number of calls of a date (and of
+a description or a place) is estimated from the share of the sample of each stratum
+which falls in it, and its error bound is the 95% confidence interval of this
+estimate (estimate ± error). A cell without any sampled call is estimated at 0 with
+no variance: its bound is the rule of three instead ('rule_of_three').
+"""
+
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from helpers import registry
+from helpers.aggregates import FREQUENCIES, join_panel
+from helpers.buckets import bucket_column, bucket_ids
+from helpers.queries import dense, known, mean_weather, panel_part
+from helpers.utils import CALLS_PATH
+
+
+APPROXIMATE = os.environ.get("NYPD_APPROXIMATE", "0") != "0"
+
+SAMPLE_PATH = os.path.join(CALLS_PATH, "_sample")
+
+# Title of the figures drawn from the sample.
+APPROXIMATE_TITLE = "Estimation sur un échantillon, calcul exact en cours"
+
+# 95% of the estimates are within this number of standard errors of the exact value.
+Z = 1.96
+
+
+class Exact:
+    # The exact figures are computed one at a time, next to the warm-up.
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="exact")
+    futures = {}
+    # The error of the last run of the tasks which failed, they are started again.
+    errors = {}
+    lock = threading.Lock()
+
+
+def read_sample():
+    sample = pd.read_parquet(os.path.join(SAMPLE_PATH, "calls.parquet"))
+    days = pd.read_parquet(os.path.join(SAMPLE_PATH, "days.parquet"))
+
+    # The number of calls of the day of each call, and the number of them drawn.
+    sample = sample.drop(columns=["hash"]).assign(
+        calls=sample.day.map(days.set_index("day").calls).values,
+        sampled=sample.day.map(sample.day.value_counts()).values,
+    )
+
+    # Like the aggregates, the calls without description or place are not counted,
+    # but they were drawn: the shares are still taken on every call drawn.
+    return sample.dropna(subset=["desc", "place"])
+
+
+def rule_of_three(sample, freq):
+    """
+    Error bound of the cells of each bucket without any sampled call. When none of the
+    n calls drawn among N falls in a cell, it has fewer than 3 N / n calls 95% of the
+    time. N and n are those of the days of the bucket, the days drawn entirely (whose
+    zeros are exact) left out.
+    """
+    days = sample.groupby("day")[["calls", "sampled"]].first()
+    days = days[days.sampled < days.calls]
+
+    # The buckets of the hours of each day, a day is in 24 buckets of 'H' and 'HW'.
+    times = days.index.values.astype("datetime64[D]")[:, None] + np.arange(24).astype(
+        "timedelta64[h]"
+    )
+    buckets = pd.DataFrame(
+        {"bucket": bucket_ids(times.ravel(), freq), "day": days.index.repeat(24)}
+    ).drop_duplicates()
+    pooled = days.loc[buckets.day].groupby(buckets.bucket.values).sum()
+
+    return 3 * pooled.calls / pooled.sampled
+
+
+def estimate(sample, freq, dim=None):
+    """
+    Estimate and error of the number of calls per date, and per value of 'dim'
+    ('desc' or 'place') when given, as two tables like 'helpers.queries.count_calls'.
+    """
+    cells = [bucket_column(freq), *([dim] if dim else [])]
+    # With 'D', the cells are the days themselves.
+    strata = sample.groupby(list(dict.fromkeys(["day", *cells])), observed=True).agg(
+        drawn=("day", "size"), calls=("calls", "first"), sampled=("sampled", "first")
+    )
+
+    # Share of the sample of the stratum in the cell, and variance of the number of
+    # calls of the stratum estimated from it.
+    share = strata.drawn / strata.sampled
+    strata["estimate"] = strata.calls * share
+    strata["variance"] = (
+        strata.calls**2
+        * (1 - strata.sampled / strata.calls)
+        * share
+        * (1 - share)
+        / np.maximum(strata.sampled - 1, 1)
+    )
+
+    table = strata.groupby(cells)[["estimate", "variance"]].sum()
+    if dim:
+        table = table.unstack(dim, fill_value=0)
+        table.columns = table.columns.set_levels(
+            table.columns.levels[1].astype(str), level=1
+        )
+    table = dense(table.sort_index(axis=1), freq)
+    floor = dense(rule_of_three(sample, freq), freq).reindex(table.index, fill_value=0)
+
+    if not dim:
+        estimates, errors = table.estimate.rename("number"), np.sqrt(table.variance)
+    else:
+        estimates, errors = table["estimate"], np.sqrt(table["variance"])
+
+    return estimates, (Z * errors).where(estimates > 0, floor, axis=0)
+
+
+def compute_panel(freq):
+    sample = registry.get("sample")
+    weather = mean_weather(freq)
+
+    estimates, errors = zip(
+        *(estimate(sample, freq, dim) for dim in (None, "desc", "place"))
+    )
+    return join_panel(*estimates, weather), join_panel(*errors, weather)
+
+
+def approximate_panel(freq="M"):
+    """
+    The panel of 'helpers.queries.load_panel' estimated from the sample, and the
+    panel of the errors of the estimates.
+    """
+    return registry.get(f"approximate_panel_{freq}")
+
+
+def weather_dates(freq="M"):
+    """
+    The dates of the slider, the dates with weather. In approximate mode, they are
+    read without waiting for the calls to be aggregated.
+    """
+    if not APPROXIMATE:
+        return panel_part(freq, "weather").index
+
+    panel, _ = approximate_panel(freq)
+    return panel.index[known(panel, "weather")]
+
+
+def computed(name, task):
+    """
+    True once 'task' is done, False before: it is then started in the background, only
+    the first time. A task which failed is forgotten, with its error kept in
+    'Exact.errors': it is started again by the next call and the estimates are still
+    shown in the meantime.
+    """
+    with Exact.lock:
+        if name not in Exact.futures:
+            Exact.futures[name] = Exact.executor.submit(task)
+        future = Exact.futures[name]
+
+        if not future.done():
+            return False
+
+        if future.exception() is not None:
+            Exact.errors[name] = repr(future.exception())
+            del Exact.futures[name]
+            return False
+
+    Exact.errors.pop(name, None)
+    return True
+
+
+# The sample and the estimates are read before everything else.
+if APPROXIMATE:
+    registry.register("sample", read_sample, priority=-1)
+    for freq in FREQUENCIES:
+        registry.register(
+            f"approximate_panel_{freq}", partial(compute_panel, freq), priority=-1
+        )
@@ -0,0 +1,137 @@
+"""
+Time buckets of the calls. Each date (with its hour) is turned into an integer id per
+frequency, the ids of two consecutive buckets are consecutive, so the number of calls
+of any combination of buckets, descriptions and places is a single 'np.bincount'.
+These numbers add up: the calls can be counted part by part ('sparse_counts').
+
+A new frequency only needs a function from the dates to the ids and one from the
+ids to the dates of the buckets, added to 'BUCKETS'.
+"""
+
+
+import numpy as np
+import pandas as pd
+
+
+def days(dates):
+    return np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+
+
+def month_ids(dates):
+    return np.asarray(dates, dtype="datetime64[M]").astype(np.int64)
+
+
+def month_labels(ids):
+    # Like pandas, a month is labelled by its last day.
+    return (ids + 1).astype("datetime64[M]").astype("datetime64[D]") - 1
+
+
+def week_ids(dates):
+    # 1970-01-01 is a Thursday, the weeks go from Monday to Sunday.
+    return (days(dates) + 3) // 7
+
+
+def week_labels(ids):
+    # Like pandas, a week is labelled by its Sunday.
+    return (ids * 7 + 3).astype("datetime64[D]")
+
+
+def day_labels(ids):
+    return ids.astype("datetime64[D]")
+
+
+def hours(dates):
+    return np.asarray(dates, dtype="datetime64[h]").astype(np.int64)
+
+
+def hour_labels(ids):
+    return ids.astype("datetime64[h]")
+
+
+def week_hour_ids(dates):
+    # Hour of the week, from 0 (Monday, 0h) to 167 (Sunday, 23h).
+    return (days(dates) + 3) % 7 * 24 + hours(dates) % 24
+
+
+def week_hour_labels(ids):
+    # The hours of the week are placed on the first week of 1970 starting on a Monday.
+    return (ids + 4 * 24).astype("datetime64[h]")
+
+
+BUCKETS = {
+    "M": (month_ids, month_labels),
+    "W": (week_ids, week_labels),
+    "D": (days, day_labels),
+    "H": (hours, hour_labels),
+    "HW": (week_hour_ids, week_hour_labels),
+}
+
+
+def bucket_ids(dates, freq):
+    return BUCKETS[freq][0](dates).astype(np.int32)
+
+
+def bucket_column(freq):
+    # The column of the ids in the calls dataset, where the day of a call is its
+    # bucket of 'D'.
+    return "day" if freq == "D" else f"bucket_{freq}"
+
+
+def bucket_labels(ids, freq):
+    return pd.DatetimeIndex(
+        BUCKETS[freq][1](np.asarray(ids, dtype=np.int64)).astype("datetime64[ns]"),
+        name="date",
+    )
+
+
+def count(ids, sizes, weights=None):
+    """
+    Number of rows (or sum of 'weights') for each combination of the ids. 'ids' is a
+    list of arrays of ids starting at 0, 'sizes' the number of values of each of them.
+    """
+    flat = np.ravel_multi_index(ids, sizes)
+    return np.bincount(flat, weights=weights, minlength=int(np.prod(sizes))).reshape(
+        sizes
+    )
+
+
+def sparse_counts(ids, weights=None):
+    """
+    Like 'count', only for the combinations of the ids which appear: the ids of each
+    combination (a list of arrays, any integers) and its number of rows (or sum of
+    'weights'). The counts of several sets of rows are added up by counting their
+    concatenation again, with their numbers as weights.
+    """
+    if not len(ids[0]):
+        return [np.asarray(column, dtype=np.int64) for column in ids], np.zeros(0, int)
+
+    firsts = [int(column.min()) for column in ids]
+    sizes = [int(column.max()) - first + 1 for column, first in zip(ids, firsts)]
+    flat = np.ravel_multi_index(
+        [column - first for column, first in zip(ids, firsts)], sizes
+    )
+
+    keys, inverse = np.unique(flat, return_inverse=True)
+    numbers = np.bincount(inverse, weights=weights).astype(np.int64)
+    combinations = [
+        column + first for column, first in zip(np.unravel_index(keys, sizes), firsts)
+    ]
+
+    return combinations, numbers
+
+
+def add_counts(parts):
+    # The sum of several results of 'sparse_counts'.
+    ids = [np.concatenate(columns) for columns in zip(*(ids for ids, _ in parts))]
+    return sparse_counts(ids, np.concatenate([numbers for _, numbers in parts]))
+
+
+def mean(ids, values, size):
+    # NaN are ignored, a bucket without any value is NaN.
+    values = np.asarray(values, dtype=float)
+    known = ~np.isnan(values)
+    totals = count([ids[known]], [size], values[known])
+    numbers = count([ids[known]], [size])
+
+    with np.errstate(invalid="ignore"):
+        return totals / numbers
@@ -0,0 +1,111 @@
+"""
+Bounded caches of the dashboard. The figures are cached as JSON, keyed by the inputs
+of the callback and the version of the data, and the least recently used entries are
+dropped once the memory budget of the cache is reached.
+"""
+
+
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+from helpers.aggregates import data_version
+from helpers.metrics import timed
+from helpers.registry import primed
+
+
+def nbytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        with self.lock:
+            if key in self.items:
+                self.hits += 1
+                self.items.move_to_end(key)
+                return self.items[key][0]
+
+            self.misses += 1
+
+        # The value may be read by other threads as soon as it is put.
+        value = primed(compute())
+        self.put(key, value)
+
+        return value
+
+    def put(self, key, value):
+        size = nbytes(value)
+
+        with self.lock:
+            if key in self.items:
+                self.size -= self.items.pop(key)[1]
+
+            # A value bigger than the whole cache is returned but never kept.
+            if size > self.max_size:
+                return
+
+            while self.size + size > self.max_size:
+                self.size -= self.items.popitem(last=False)[1][1]
+
+            self.items[key] = (value, size)
+            self.size += size
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.items),
+            "size": self.size,
+            "max_size": self.max_size,
+        }
+
+
+figure_cache = LRUCache(int(os.environ.get("NYPD_FIGURE_CACHE_MB", "64")) * 1024**2)
+data_cache = LRUCache(int(os.environ.get("NYPD_DATA_CACHE_MB", "256")) * 1024**2)
+
+
+def cached_figure(name, build, *args):
+    """
+    The figure 'build(*args)' as JSON, 'args' being the frequency and the other
+    inputs of the callback (slider value, size value). 'build' can also return
+    a dict containing figures.
+    """
+
+    def compute():
+        with timed("figure"):
+            figure = build(*args)
+        with timed("serialization"):
+            return to_json_plotly(figure)
+
+    figure = figure_cache.get((name, *args, data_version()), compute)
+    with timed("serialization"):
+        return json.loads(figure)
+
+
+def cached_data(name, build, freq):
+    def compute():
+        with timed("aggregation"):
+            return build(freq)
+
+    return data_cache.get((name, freq, data_version()), compute)
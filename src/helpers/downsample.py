@@ -0,0 +1,79 @@
+"""
+Downsampling of the long series drawn as lines. Only 'MAX_POINTS' points are sent to
+the browser, chosen with the Largest-Triangle-Three-Buckets algorithm: the series is
+cut in buckets and the point of each bucket which forms the largest triangle with
+its neighbours is kept, so the peaks stay visible.
+
+When the user zooms, the figure is built again for the visible dates only, which are
+then drawn at full resolution as soon as they fit in 'MAX_POINTS'.
+"""
+
+
+import os
+
+import numpy as np
+
+
+# 0 sends every point.
+MAX_POINTS = int(os.environ.get("NYPD_MAX_POINTS", "1000"))
+
+
+def lttb(x, y, n_out):
+    """
+    Positions of the 'n_out' points of (x, y) kept by LTTB, the first and the last
+    points are always kept.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # n_out - 2 buckets between the first and the last point.
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+
+    selected = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+
+        # The third point of the triangle is the mean of the next bucket.
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+
+        areas = np.abs(
+            (x[selected] - next_x) * (y[start:end] - y[selected])
+            - (x[selected] - x[start:end]) * (next_y - y[selected])
+        )
+        selected = start + np.argmax(np.nan_to_num(areas, nan=-1))
+        keep[i + 1] = selected
+
+    return keep
+
+
+def downsample(series, max_points=MAX_POINTS):
+    """
+    At most 'max_points' points of a Series indexed by dates.
+    """
+    if not max_points or len(series) <= max_points:
+        return series
+
+    x = series.index.values.astype(np.int64).astype(float)
+    return series.iloc[lttb(x, series.values.astype(float), max_points)]
+
+
+def visible_range(relayout):
+    """
+    The dates shown by a graph after a 'relayoutData' event: (start, end), (None, None)
+    when the whole x axis is shown again, None when the x axis did not change.
+    """
+    relayout = relayout or {}
+
+    if "xaxis.range[0]" in relayout:
+        return relayout["xaxis.range[0]"], relayout["xaxis.range[1]"]
+    if "xaxis.range" in relayout:
+        return tuple(relayout["xaxis.range"])
+    if relayout.get("xaxis.autorange"):
+        return None, None
+
+    return None
@@ -0,0 +1,177 @@
+"""
+Export of the aggregates behind the figures, for the teams which need the numbers and
+not the figures. They are served by the dashboard on:
+	- /export/calls?freq=W&dims=desc,place&start=2019-01-01&end=2019-06-30: the number
+	of calls per date and per value of 'dims' (see 'helpers.queries.count_calls').
+	- /export/weather?freq=W&start=...&end=...: the mean of the weather per date.
+'freq' is one of 'helpers.aggregates.FREQUENCIES', every parameter is optional. The
+hours of the week (HW) are dated on a week of 1970: they take no 'start' or 'end'.
+
+The table is sent as CSV, or as an Arrow IPC stream with 'format=arrow', 'ROWS' rows
+at a time: a long range is never written in memory at once. It is compressed with
+zstd or gzip, the first one accepted by the client ('Accept-Encoding').
+
+The ETag of a response depends on the version of the data and on the request. A
+client which sends it back ('If-None-Match') gets a 304 until the data changes.
+"""
+
+
+import hashlib
+import io
+import zlib
+
+import pandas as pd
+import pyarrow as pa
+from flask import Response, jsonify
+
+from helpers.aggregates import FREQUENCIES, data_version
+from helpers.queries import count_calls, mean_weather
+
+
+# zstd is only offered when 'zstandard' is installed.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+ROWS = 10_000
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+DIMS = ["desc", "place"]
+
+
+def parse_request(name, args):
+    """
+    The parameters of an export from the arguments of the URL, a ValueError when one of
+    them is wrong.
+    """
+    if name not in ("calls", "weather"):
+        raise ValueError(f"unknown export '{name}', expected 'calls' or 'weather'")
+
+    params = {
+        "name": name,
+        "freq": args.get("freq", "M"),
+        "dims": [dim for dim in args.get("dims", "").split(",") if dim],
+        "start": args.get("start"),
+        "end": args.get("end"),
+        "format": args.get("format", "csv"),
+    }
+
+    if params["freq"] not in FREQUENCIES:
+        raise ValueError(f"'freq' must be one of {FREQUENCIES}")
+    if params["format"] not in FORMATS:
+        raise ValueError(f"'format' must be one of {list(FORMATS)}")
+    if any(dim not in DIMS for dim in params["dims"]) or (
+        params["dims"] and name != "calls"
+    ):
+        raise ValueError(f"'dims' must be a list of {DIMS}, for the calls only")
+    for date in ("start", "end"):
+        try:
+            pd.Timestamp(params[date])
+        except ValueError:
+            raise ValueError(f"'{date}' must be a date, like 2019-01-31") from None
+    # The hours of the week are dated on a week of 1970, whatever the dates.
+    if params["freq"] == "HW" and (params["start"] or params["end"]):
+        raise ValueError("'start' and 'end' cannot be given with 'freq' HW")
+
+    return params
+
+
+def read_table(params):
+    if params["name"] == "weather":
+        table = mean_weather(params["freq"], params["start"], params["end"])
+    else:
+        table = count_calls(
+            params["freq"], params["dims"], params["start"], params["end"]
+        )
+
+    table = table.to_frame() if isinstance(table, pd.Series) else table
+    if isinstance(table.columns, pd.MultiIndex):
+        # One column per (desc, place): 'Assault/Intérieur', ...
+        table = table.set_axis(
+            ["/".join(map(str, column)) for column in table.columns], axis=1
+        )
+
+    return table.reset_index()
+
+
+def csv_chunks(table):
+    for first in range(0, max(len(table), 1), ROWS):
+        yield table.iloc[first : first + ROWS].to_csv(
+            index=False, header=first == 0, date_format="%Y-%m-%d %H:%M:%S"
+        ).encode()
+
+
+def arrow_chunks(table):
+    sink = io.BytesIO()
+    schema = pa.Schema.from_pandas(table, preserve_index=False)
+
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for first in range(0, len(table), ROWS):
+            writer.write_batch(
+                pa.RecordBatch.from_pandas(
+                    table.iloc[first : first + ROWS], schema, preserve_index=False
+                )
+            )
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+
+    # The end of the stream, and the schema when the table is empty.
+    yield sink.getvalue()
+
+
+def compressed(chunks, encoding):
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor().compressobj()
+    elif encoding == "gzip":
+        compressor = zlib.compressobj(wbits=31)
+    else:
+        yield from chunks
+        return
+
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export(name, request):
+    """
+    The response of the export 'name' ('calls' or 'weather') to a Flask request.
+    """
+    try:
+        params = parse_request(name, request.args)
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+    encoding = request.accept_encodings.best_match(
+        ["zstd", "gzip"] if zstandard else ["gzip"]
+    )
+    etag = hashlib.sha1(
+        repr((data_version(), sorted(params.items()), encoding)).encode()
+    ).hexdigest()
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        table = read_table(params)
+        chunks = (csv_chunks if params["format"] == "csv" else arrow_chunks)(table)
+        response = Response(
+            compressed(chunks, encoding), content_type=FORMATS[params["format"]]
+        )
+        if encoding:
+            response.content_encoding = encoding
+
+    response.set_etag(etag)
+    # Cached by the client, but always checked against the ETag.
+    response.cache_control.no_cache = True
+    response.vary.add("Accept-Encoding")
+
+    return response
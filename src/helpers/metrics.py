@@ -0,0 +1,159 @@
+"""
+Timings of the callbacks, served in the text format of Prometheus on '/metrics'.
+
+Each callback is timed as a whole (stage 'total') and by stage:
+	- load: reading the aggregates (see 'helpers.registry').
+	- aggregation: the tables computed from them (see 'helpers.cache.cached_data'), or
+	from the calls with another backend than the aggregates (see 'helpers.queries').
+	- outliers: the series cleaned by 'helpers.outliers'.
+	- figure: building the plotly figure.
+	- serialization: the figure to and from JSON.
+The stages can be nested, the time of a stage includes the stages inside it. The work
+done outside of a callback (the warm-up) is labelled with the callback 'none'.
+
+With NYPD_PROFILE set to a rate between 0 and 1, this fraction of the callbacks is
+profiled with cProfile. The statistics are written in NYPD_PROFILE_DIR ('profiles'
+by default), one file per callback, to be read with 'python -m pstats'.
+"""
+
+
+import bisect
+import contextvars
+import cProfile
+import functools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from itertools import accumulate
+
+
+# In seconds, the default buckets of Prometheus.
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+PROFILE_RATE = float(os.environ.get("NYPD_PROFILE", "0"))
+PROFILE_DIR = os.environ.get("NYPD_PROFILE_DIR", "profiles")
+
+current_callback = contextvars.ContextVar("callback", default="none")
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # The last one counts the values above every bucket.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Metrics:
+    histograms = {}
+    lock = threading.Lock()
+    # Only one callback is profiled at a time.
+    profile_lock = threading.Lock()
+
+
+def observe(stage, seconds):
+    key = (current_callback.get(), stage)
+
+    with Metrics.lock:
+        if key not in Metrics.histograms:
+            Metrics.histograms[key] = Histogram()
+        Metrics.histograms[key].observe(seconds)
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def profiled(name, callback, *args, **kwargs):
+    if not Metrics.profile_lock.acquire(blocking=False):
+        return callback(*args, **kwargs)
+
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(callback, *args, **kwargs)
+    finally:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profile.dump_stats(os.path.join(PROFILE_DIR, f"{name}-{time.time_ns()}.prof"))
+        Metrics.profile_lock.release()
+
+
+def instrument(name):
+    """
+    Decorator of a callback, placed under '@app.callback': the callback and the
+    stages it goes through are timed under 'name'.
+    """
+
+    def decorator(callback):
+        @functools.wraps(callback)
+        def timed_callback(*args, **kwargs):
+            token = current_callback.set(name)
+            try:
+                with timed("total"):
+                    if PROFILE_RATE and random.random() < PROFILE_RATE:
+                        return profiled(name, callback, *args, **kwargs)
+                    return callback(*args, **kwargs)
+            finally:
+                current_callback.reset(token)
+
+        return timed_callback
+
+    return decorator
+
+
+def render(caches={}):
+    """
+    Every histogram, and the counters of the caches ({name: LRUCache}), in the text
+    format of Prometheus.
+    """
+    lines = [
+        "# HELP nypd_callback_seconds Time spent in each stage of the callbacks.",
+        "# TYPE nypd_callback_seconds histogram",
+    ]
+
+    with Metrics.lock:
+        histograms = {
+            key: (list(histogram.counts), histogram.sum)
+            for key, histogram in Metrics.histograms.items()
+        }
+
+    for (callback, stage), (counts, total) in sorted(histograms.items()):
+        labels = f'callback="{callback}",stage="{stage}"'
+
+        # The buckets of Prometheus are cumulative.
+        for bound, count in zip(BUCKETS + ["+Inf"], accumulate(counts)):
+            lines.append(
+                f'nypd_callback_seconds_bucket{{{labels},le="{bound}"}} {count}'
+            )
+        lines.append(f"nypd_callback_seconds_sum{{{labels}}} {total}")
+        lines.append(f"nypd_callback_seconds_count{{{labels}}} {sum(counts)}")
+
+    for metric, kind, description in [
+        ("hits", "counter", "Values found in the cache."),
+        ("misses", "counter", "Values computed because they were not in the cache."),
+        ("entries", "gauge", "Number of values in the cache."),
+        ("size", "gauge", "Memory used by the values of the cache, in bytes."),
+        ("max_size", "gauge", "Memory budget of the cache, in bytes."),
+    ]:
+        name = (
+            f"nypd_cache_{metric}_total"
+            if kind == "counter"
+            else f"nypd_cache_{metric}"
+        )
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+
+        for cache, values in sorted(caches.items()):
+            lines.append(f'{name}{{cache="{cache}"}} {values.stats()[metric]}')
+
+    return "\n".join(lines) + "\n"
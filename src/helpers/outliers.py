@@ -0,0 +1,41 @@
+"""
+Series of the panel ('helpers.queries.load_panel') without their outliers, as used
+by the figures and by the regressions of 'helpers.analytics'.
+
+A series is cleaned once per frequency, method and threshold (see
+'helpers.utils.remove_outliers'), and kept in the data cache with the version of
+the aggregates: the callbacks never clean the same series twice.
+"""
+
+
+from helpers.aggregates import data_version
+from helpers.cache import data_cache
+from helpers.metrics import timed
+from helpers.queries import panel_part
+from helpers.utils import remove_outliers
+
+
+def read_series(name, freq="M"):
+    # 'total' is the number of calls, ('desc', value) or ('place', value) the number of
+    # calls of a description or a place, any other name a column of the weather.
+    if name == "total":
+        return panel_part(freq, "total").total
+
+    if isinstance(name, tuple):
+        dim, value = name
+        return panel_part(freq, dim)[value]
+
+    return panel_part(freq, "weather")[name]
+
+
+def clean_series(name, freq="M", method="zscore", threshold=2, window=15):
+    key = ("outliers", name, freq, method, threshold, window, data_version())
+
+    def compute():
+        series = read_series(name, freq)
+        with timed("outliers"):
+            return remove_outliers(
+                series, method=method, threshold=threshold, window=window
+            )
+
+    return data_cache.get(key, compute)
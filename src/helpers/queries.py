@@ -0,0 +1,388 @@
+"""
+The two queries made by the figures, whatever computes them:
+	- count_calls(freq, dims, start, end): the number of calls per date and per value
+	of 'dims' ('desc', 'place' or both), the total number of calls without 'dims'.
+	- mean_weather(freq, start, end): the mean of the weather per date.
+	- load_panel(freq): both joined on the same dates (see 'helpers.aggregates.join_panel'),
+	the table read by every figure.
+The dates are the labels of the buckets of 'freq' (see 'helpers.buckets'), only the
+buckets whose label is between start and end are kept.
+
+The backend is chosen with NYPD_BACKEND:
+	- cube (default): read from the aggregates of 'data/aggregates', nothing is computed.
+	- pandas: computed from the calls dataset and 'weather.parquet', the reference. The
+	calls are grouped by their day and hour with the frequencies of pandas, not by
+	the buckets stored with them.
+	- duckdb: computed by DuckDB on the same files, on every core. It needs 'duckdb'.
+Every backend returns the same tables: one row per date from the first to the last
+date with a call (or with a weather), and one column per value with a call, sorted.
+'check_backend' compares a backend with the reference.
+
+A new backend only needs a function for each query, added to 'BACKENDS'.
+"""
+
+
+import os
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from helpers import registry
+from helpers.aggregates import (
+    FREQUENCIES,
+    calls_by,
+    data_version,
+    hourly_weather,
+    join_panel,
+    load_calls_cube,
+    load_calls_total,
+    load_weather_means,
+)
+from helpers.buckets import bucket_column, bucket_ids, bucket_labels
+from helpers.cache import data_cache
+from helpers.metrics import timed
+from helpers.utils import (
+
+
+    CALLS_PATH,
+    WEATHER_PATH,
+    load_calls_correlation_data,
+    load_weather_data,
+)
+
+BACKEND = os.environ.get("NYPD_BACKEND", "cube")
+
+DIMS = [(), ("desc",), ("place",), ("desc", "place")]
+
+# The bucket ids of the weather in SQL, from the day ('day', days since 1970-01-01)
+# and the hour ('h') like 'helpers.buckets'.
+SQL_BUCKETS = {
+    "M": "(year(date) - 1970) * 12 + month(date) - 1",
+    "W": "(day + 3) // 7",
+    "D": "day",
+    "H": "day * 24 + h",
+    "HW": "(day + 3) % 7 * 24 + h",
+}
+
+# The frequencies of pandas of the buckets, a week ends on Sunday. The hours of the
+# week are grouped apart, on the hours of the week of 1970-01-05.
+PANDAS_FREQUENCIES = {"M": "M", "W": "W-SUN", "D": "D", "H": "H", "HW": "H"}
+
+
+def bucket_range(freq, start=None, end=None):
+    """
+    The first and the last ids of the buckets whose label is between start and end,
+    so that only their calls are read. None when there is no bound: the hours of the
+    week are labelled on a week of 1970, whatever the dates of the calls.
+    """
+    first = last = None
+    if freq == "HW":
+        return first, last
+
+    if start is not None:
+        start = pd.Timestamp(start)
+        first = int(bucket_ids([start.to_datetime64()], freq)[0])
+        if bucket_labels([first], freq)[0] < start:
+            first += 1
+
+    if end is not None:
+        end = pd.Timestamp(end)
+        last = int(bucket_ids([end.to_datetime64()], freq)[0])
+        if bucket_labels([last], freq)[0] > end:
+            last -= 1
+
+    return first, last
+
+
+def dense(table, freq, start=None, end=None, fill_value=0):
+    """
+    'table' indexed by bucket ids, with a row for every id from the first to the last
+    one whose label is between start and end, labelled by dates.
+    """
+    labels = bucket_labels(table.index.values, freq)
+    table = table[
+        (labels >= pd.Timestamp(start or labels.min()))
+        & (labels <= pd.Timestamp(end or labels.max()))
+    ]
+
+    ids = np.arange(table.index.min(), table.index.max() + 1) if len(table) else []
+    table = table.reindex(ids, fill_value=fill_value)
+    table.index = bucket_labels(table.index.values, freq)
+
+    return table
+
+
+def dense_dates(table, freq, start=None, end=None, fill_value=0):
+    # Like 'dense', for a table already labelled by dates.
+    table = table.sort_index().loc[start:end]
+    dates = (
+        pd.date_range(
+            table.index.min(),
+            table.index.max(),
+            freq=PANDAS_FREQUENCIES[freq],
+            name="date",
+        )
+        if len(table)
+        else pd.DatetimeIndex([], name="date")
+    )
+
+    return table.reindex(dates, fill_value=fill_value)
+
+
+def counts_table(counts, freq, dims, start=None, end=None, labelled=False):
+    # 'counts' is indexed by the bucket ids (or by their dates when 'labelled') then
+    # the values of 'dims'.
+    fill = dense_dates if labelled else dense
+    if not dims:
+        return trimmed(fill(counts.rename("number"), freq, start, end))
+
+    table = counts.unstack(list(dims), fill_value=0)
+    table.columns = (
+        pd.Index(table.columns.astype(str), name=dims[0])
+        if len(dims) == 1
+        else pd.MultiIndex.from_tuples(list(table.columns), names=list(dims))
+    )
+
+    return trimmed(fill(table.sort_index(axis=1), freq, start, end))
+
+
+def trimmed(table):
+    # The dates before the first call and after the last one, and the values without
+    # any call, are dropped.
+    totals = table.values.sum(axis=1) if table.ndim == 2 else table.values
+    rows = np.flatnonzero(totals)
+    table = table.iloc[rows[0] : rows[-1] + 1] if len(rows) else table.iloc[:0]
+
+    if isinstance(table, pd.DataFrame):
+        used = table.values.sum(axis=0) > 0
+        if not used.all():
+            table = table.loc[:, used]
+            if isinstance(table.columns, pd.MultiIndex):
+                table.columns = table.columns.remove_unused_levels()
+
+    return table
+
+
+def cube_count_calls(freq, dims=(), start=None, end=None):
+    if not dims:
+        table = load_calls_total(freq)
+    elif len(dims) == 1:
+        table = calls_by(freq, dims[0])
+    else:
+        cube = load_calls_cube(freq)
+        labels = registry.get("labels")
+        table = pd.DataFrame(
+            cube.reshape(len(cube), -1),
+            index=registry.get(f"dates_{freq}"),
+            columns=pd.MultiIndex.from_product(
+                [labels["desc"], labels["place"]], names=["desc", "place"]
+            ),
+            copy=False,
+        )
+        # The cube is ordered (desc, place) like the labels.
+        if list(dims) != ["desc", "place"]:
+            table = table.swaplevel(axis=1).sort_index(axis=1)
+
+    return trimmed(table.loc[start:end])
+
+
+def cube_mean_weather(freq, start=None, end=None):
+    return load_weather_means(freq).loc[start:end]
+
+
+def calls_period(freq, start=None, end=None):
+    # The days of the calls of the buckets whose label is between start and end. A
+    # month or a week is labelled by its last day, its calls start up to a month
+    # earlier. The hours of the week are labelled in 1970, whatever the days.
+    if freq == "HW":
+        return None, None
+
+    return None if start is None else start - pd.DateOffset(months=1), end
+
+
+def pandas_buckets(dates, freq):
+    # What the rows indexed by 'dates' are grouped by.
+    if freq == "HW":
+        return pd.DatetimeIndex(
+            pd.Timestamp("1970-01-05")
+            + pd.to_timedelta(dates.dayofweek * 24 + dates.hour, unit="h"),
+            name="date",
+        )
+
+    return pd.Grouper(freq=PANDAS_FREQUENCIES[freq])
+
+
+def pandas_count_calls(freq, dims=(), start=None, end=None):
+    # Like the aggregates, the calls without description or place are not counted.
+    calls = load_calls_correlation_data(
+        ["hour", "desc", "place"], *calls_period(freq, start, end)
+    ).dropna(subset=["desc", "place"])
+    calls.index = pd.DatetimeIndex(
+        calls.day.values.astype("datetime64[D]")
+        + calls.hour.values.astype(np.int64).astype("timedelta64[h]")
+    )
+    counts = calls.groupby(
+        [pandas_buckets(calls.index, freq), *dims], observed=True
+    ).size()
+
+    return counts_table(counts, freq, dims, start, end, labelled=True)
+
+
+def pandas_mean_weather(freq, start=None, end=None):
+    weather = hourly_weather(load_weather_data())
+    means = weather.groupby(pandas_buckets(weather.index, freq)).mean()
+
+    return dense_dates(means, freq, start, end, fill_value=np.nan)
+
+
+def duckdb_query(query, parameters=None):
+    # Imported here, DuckDB is only needed by this backend.
+    import duckdb
+
+    with duckdb.connect() as connection:
+        return connection.execute(query, parameters).df()
+
+
+def duckdb_count_calls(freq, dims=(), start=None, end=None):
+    first, last = bucket_range(freq, start, end)
+    bucket = bucket_column(freq)
+    # 'desc' is a keyword of SQL.
+    columns = "".join(f', "{dim}"' for dim in dims)
+
+    counts = duckdb_query(
+        f"""
+        SELECT {bucket} AS bucket{columns}, count(*) AS number
+        FROM read_parquet('{CALLS_PATH}/month=*/*.parquet', hive_partitioning = true)
+        WHERE "desc" IS NOT NULL AND place IS NOT NULL
+            AND {bucket} >= coalesce(?, {bucket})
+            AND {bucket} <= coalesce(?, {bucket})
+        GROUP BY ALL
+        """,
+        [first, last],
+    )
+
+    return counts_table(
+        counts.set_index(["bucket", *dims]).number, freq, dims, start, end
+    )
+
+
+def duckdb_mean_weather(freq, start=None, end=None):
+    columns = pd.read_parquet(WEATHER_PATH).columns
+    means = duckdb_query(f"""
+        SELECT {SQL_BUCKETS[freq]} AS bucket,
+            {", ".join(f'avg("{column}") AS "{column}"' for column in columns)}
+        FROM (
+            SELECT *, datediff('day', TIMESTAMP '1970-01-01', date) AS day
+            FROM read_parquet('{WEATHER_PATH}')
+        ), range(24) AS hours(h)
+        GROUP BY bucket
+        """)
+
+    return dense(means.set_index("bucket"), freq, start, end, fill_value=np.nan)
+
+
+BACKENDS = {
+    "cube": (cube_count_calls, cube_mean_weather),
+    "pandas": (pandas_count_calls, pandas_mean_weather),
+    "duckdb": (duckdb_count_calls, duckdb_mean_weather),
+}
+
+
+def timestamp(date):
+    return None if date is None else pd.Timestamp(date)
+
+
+def query(backend, number, *args):
+    # The cube is already in memory, the other backends compute each result once.
+    if backend == "cube":
+        return BACKENDS[backend][number](*args)
+
+    def compute():
+        with timed("aggregation"):
+            return BACKENDS[backend][number](*args)
+
+    return data_cache.get(("query", backend, number, *args, data_version()), compute)
+
+
+def count_calls(freq="M", dims=(), start=None, end=None, backend=None):
+    """
+    Number of calls per date (rows) and per value of 'dims' (columns), a Series
+    without 'dims'.
+    """
+    return query(
+        backend or BACKEND, 0, freq, tuple(dims), timestamp(start), timestamp(end)
+    )
+
+
+def mean_weather(freq="M", start=None, end=None, backend=None):
+    """
+    Mean of the weather per date (rows), for each of its columns.
+    """
+    return query(backend or BACKEND, 1, freq, timestamp(start), timestamp(end))
+
+
+def load_panel(freq="M", backend=None):
+    """
+    The calls and the weather on the same dates, as a DataFrame whose columns are
+    (dim, value). With the cube, it is read as it was written by 'data/get_data.py'.
+    """
+    backend = backend or BACKEND
+    if backend == "cube":
+        return registry.get(f"panel_{freq}")
+
+    def compute():
+        return join_panel(
+            count_calls(freq, backend=backend),
+            count_calls(freq, ["desc"], backend=backend),
+            count_calls(freq, ["place"], backend=backend),
+            mean_weather(freq, backend=backend),
+        )
+
+    return data_cache.get(("panel", backend, freq, data_version()), compute)
+
+
+def known(panel, dim):
+    # The dates with calls (dim 'total', 'desc' or 'place'), or with weather.
+    return panel[dim].notna().any(axis=1).values
+
+
+def panel_part(freq, dim):
+    """
+    The columns of 'dim' in the panel, on the dates where they are known.
+    """
+    panel = load_panel(freq)
+    return panel[dim][known(panel, dim)]
+
+
+def check_backend(backend, reference="pandas", frequencies=FREQUENCIES, **dates):
+    """
+    Differences between the results of 'backend' and of 'reference', for every query
+    of every frequency: {query: error}. Nothing is returned when they are the same.
+    'dates' are the start and the end of the queries.
+    """
+    errors = {}
+
+    for freq in frequencies:
+        queries = {
+            f"count_calls({freq!r}, {list(dims)})": partial(
+                count_calls, freq, dims, **dates
+            )
+            for dims in DIMS
+        }
+        queries[f"mean_weather({freq!r})"] = partial(mean_weather, freq, **dates)
+        queries[f"load_panel({freq!r})"] = partial(load_panel, freq)
+
+        for name, run in queries.items():
+            try:
+                result, expected = run(backend=backend), run(backend=reference)
+                assert_equal = (
+                    pd.testing.assert_series_equal
+                    if isinstance(result, pd.Series)
+                    else pd.testing.assert_frame_equal
+                )
+                assert_equal(result, expected, check_dtype=False, check_freq=False)
+            except Exception as error:
+                errors[name] = repr(error)
+
+    return errors
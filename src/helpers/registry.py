@@ -0,0 +1,140 @@
+"""
+Registry of the datasets used by the dashboard. A dataset is registered with the
+function which loads it, and is only loaded the first time a callback asks for it.
+
+The warm-up loads every dataset in advance, with the other tasks added by
+'schedule' (the figures asked first by the users), on a few background threads.
+The tasks of lowest priority start first, 'ready()' tells when all of them are done
+and 'status()' how far the warm-up is.
+"""
+
+
+import os
+import threading
+from functools import partial
+from queue import Empty, PriorityQueue
+
+import pandas as pd
+
+from helpers.metrics import timed
+
+
+WARM_UP_WORKERS = int(os.environ.get("NYPD_WARM_UP_WORKERS", "2"))
+
+
+class Registry:
+    loaders = {}
+    locks = {}
+    datasets = {}
+    # Everything computed by the warm-up: name -> (priority, function).
+    tasks = {}
+    # The tasks done by the warm-up: name -> None, or the error of the task.
+    finished = {}
+    warm_up = None
+
+
+def register(name, loader, priority=0):
+    Registry.loaders[name] = loader
+    Registry.locks[name] = threading.Lock()
+    schedule(name, partial(get, name), priority)
+
+
+def schedule(name, task, priority=0):
+    # The tasks of the same priority start in the order they were scheduled.
+    Registry.tasks[name] = (priority, task)
+
+
+def primed(dataset):
+    """
+    pandas fills the lookup caches of an index the first time it is used, without a
+    lock: they are filled here, before the other threads can see the dataset (or the
+    value of 'helpers.cache'). The tables may be in a tuple or a dict.
+    """
+    if isinstance(dataset, tuple):
+        return type(dataset)(primed(item) for item in dataset)
+    if isinstance(dataset, dict):
+        return {key: primed(item) for key, item in dataset.items()}
+    if not isinstance(dataset, (pd.Series, pd.DataFrame)):
+        return dataset
+
+    for index in dataset.axes:
+        for part in [index, *getattr(index, "levels", [])]:
+            # Both are cached by pandas and read by the lookups.
+            _ = part.is_unique, part.is_monotonic_increasing
+            if len(part):
+                part.get_loc(part[0])
+        # A lookup on the first level only, like 'panel["weather"]'.
+        if isinstance(index, pd.MultiIndex) and len(index):
+            index.get_loc(index[0][0])
+
+    return dataset
+
+
+def get(name):
+    if name not in Registry.datasets:
+        # Two callbacks asking for the same dataset at the same time only load it once.
+        with Registry.locks[name]:
+            if name not in Registry.datasets:
+                with timed("load"):
+                    Registry.datasets[name] = primed(Registry.loaders[name]())
+
+    return Registry.datasets[name]
+
+
+def run_task(name):
+    try:
+        Registry.tasks[name][1]()
+        Registry.finished[name] = None
+    except Exception as error:
+        # The callbacks will meet the same error, the warm-up goes on.
+        Registry.finished[name] = repr(error)
+
+
+def warm_up(background=True, workers=WARM_UP_WORKERS):
+    queue = PriorityQueue()
+    for order, (name, (priority, _)) in enumerate(Registry.tasks.items()):
+        queue.put((priority, order, name))
+
+    def work():
+        while True:
+            try:
+                _, _, name = queue.get_nowait()
+            except Empty:
+                return
+            run_task(name)
+
+    Registry.warm_up = [
+        threading.Thread(target=work, name=f"warm-up-{i}", daemon=True)
+        for i in range(workers)
+    ]
+    for thread in Registry.warm_up:
+        thread.start()
+
+    if not background:
+        for thread in Registry.warm_up:
+            thread.join()
+
+
+def ready():
+    # Without warm-up, the datasets are loaded on demand and the dashboard is always ready.
+    return Registry.warm_up is None or len(Registry.finished) == len(Registry.tasks)
+
+
+def status():
+    finished = dict(Registry.finished)
+
+    return {
+        "ready": ready(),
+        "progress": len(finished) / max(len(Registry.tasks), 1),
+        "loaded": sorted(
+            name for name in Registry.loaders if name in Registry.datasets
+        ),
+        "done": sorted(name for name, error in finished.items() if error is None),
+        "failed": {
+            name: error for name, error in finished.items() if error is not None
+        },
+        "pending": sorted(
+            (name for name in Registry.tasks if name not in finished),
+            key=lambda name: Registry.tasks[name][0],
+        ),
+    }
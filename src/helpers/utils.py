@@ -2,31 +2,141 @@ import numpy as np
 import pandas as pd
 
 
-class Dataset:
-    calls = None
-    weather = None
+CALLS_PATH = "data/NYPD_calls"
+WEATHER_PATH = "data/weather.parquet"
 
+# Name of each frequency in the titles of the figures.
+FREQUENCY_NAMES = {
+    "M": "mois",
+    "W": "semaine",
+    "D": "jour",
+    "H": "heure",
+    "HW": "heure de la semaine",
+}
 
-def remove_outliers(x, standardize=False):
-    data = x.fillna(method='ffill').fillna(method='backfill')
-    data = data.where(np.abs((data - data.mean()) / data.std()) <= 2, np.nan)
-    data = data.fillna(method='ffill').fillna(method='backfill')
+# Dates given to the figures by the slider, and dates shown to the user.
+DATE_FORMATS = {
+    "M": "%Y-%m-%d",
+    "W": "%Y-%m-%d",
+    "D": "%Y-%m-%d",
+    "H": "%Y-%m-%d %H:%M",
+    "HW": "%Y-%m-%d %H:%M",
+}
+LABEL_FORMATS = {**DATE_FORMATS, "H": "%Y-%m-%d %Hh", "HW": "{weekday} %Hh"}
+
+# Dates in the hover of the figures (d3 format).
+HOVER_FORMATS = {
+    "M": "%d/%m/%y",
+    "W": "%d/%m/%y",
+    "D": "%d/%m/%y",
+    "H": "%d/%m/%y %Hh",
+    "HW": "%a %Hh",
+}
+
+WEEKDAYS = ["Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche"]
+
+# The hours of the week are dated on the week of 1970-01-05, only the days are shown.
+WEEK_HOUR_AXIS = dict(
+    tickvals=pd.date_range("1970-01-05", periods=7).strftime("%Y-%m-%d").tolist(),
+    ticktext=WEEKDAYS,
+)
+
+
+OUTLIER_METHODS = ["zscore", "mad", "rolling"]
+
+
+def outlier_scores(data, method="zscore", window=15):
+    if method == "zscore":
+        return (data - data.mean()) / data.std()
+
+    if method == "mad":
+        # 1.4826 * MAD is the standard deviation of a normal distribution.
+        deviation = data - data.median()
+        return deviation / (1.4826 * deviation.abs().median())
+
+    if method == "rolling":
+        # Compared with the dates around it only, a trend is not an outlier.
+        rolling = data.rolling(window, center=True, min_periods=2)
+        return (data - rolling.mean()) / rolling.std()
+
+    raise ValueError(f"Unknown method '{method}', expected one of {OUTLIER_METHODS}")
+
+
+def remove_outliers(x, standardize=False, method="zscore", threshold=2, window=15):
+    """
+    Replace the outliers of a Series (or of each column of a DataFrame) by the
+    previous value. The missing values are filled the same way, with the next value
+    at the start. The index is not changed and the result has no missing value,
+    unless a whole column is missing.
+
+    A value is an outlier when its score is above 'threshold':
+        - zscore: distance to the mean, divided by the standard deviation.
+        - mad: distance to the median, divided by the median absolute deviation,
+          which the outliers themselves do not move.
+        - rolling: z-score among the 'window' dates around the value.
+    The score is undefined when the spread is 0: a constant column, or with 'mad' a
+    column whose values are mostly equal (snow), is then entirely missing.
+
+    With 'standardize', the values are scaled by the range of the column, from 0 (its
+    minimum) to 1 (its maximum).
+    """
+    data = x.ffill().bfill()
+    data = data.where(np.abs(outlier_scores(data, method, window)) <= threshold)
+    data = data.ffill().bfill()
 
     if standardize:
-        return (data - data.min()) / (data.min() - data.max())
+        return (data - data.min()) / (data.max() - data.min())
 
     return data
 
 
-def load_calls_correlation_data():
-    if Dataset.calls is None:
-        Dataset.calls = pd.read_pickle("data/NYPD_calls.pkl")
+def format_date(date, freq):
+    return date.strftime(DATE_FORMATS[freq])
+
+
+def format_label(date, freq):
+    return date.strftime(LABEL_FORMATS[freq].format(weekday=WEEKDAYS[date.weekday()]))
+
+
+def date_filters(start=None, end=None, partitioned=False):
+    """
+    Filters of the rows between start and end. The calls dataset ('partitioned') is
+    split by month and stores its days as a number of days since 1970-01-01 ('day').
+    """
+    filters = []
+
+    for operator, date in ((">=", start), ("<=", end)):
+        if date is None:
+            continue
+
+        date = pd.Timestamp(date)
+        if partitioned:
+            filters.append(("month", operator, date.strftime("%Y-%m")))
+            filters.append(("day", operator, (date - pd.Timestamp(0)).days))
+        else:
+            filters.append(("date", operator, date))
+
+    return filters or None
+
 
-    return Dataset.calls
+def load_calls_correlation_data(columns=None, start=None, end=None):
+    """
+    Read the calls from the parquet dataset. Only the given columns are read
+    (all of them when None) and only the months between start and end are opened.
+    The texts are categories and the day an int32 number of days since 1970-01-01
+    ('day'), there is no Python object per call. Nothing is kept here, the results
+    computed from the calls are cached by 'helpers.queries'.
+    """
+    data = pd.read_parquet(
+        CALLS_PATH,
+        columns=None if columns is None else ["day", *columns],
+        filters=date_filters(start, end, partitioned=True),
+    )
 
+    return data.drop(columns=["month"], errors="ignore")
 
-def load_weather_data():
-    if Dataset.weather is None:
-        Dataset.weather = pd.read_pickle("data/weather.pkl")
 
-    return Dataset.weather
+def load_weather_data(columns=None, start=None, end=None):
+    return pd.read_parquet(
+        WEATHER_PATH, columns=columns, filters=date_filters(start, end)
+    )